@@ -0,0 +1,25 @@
+""" Agent card route with an ETag, shared by the title and outline agent servers """
+
+import hashlib
+import json
+
+from a2a.types import AgentCard
+from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+def agent_card_route(agent_card: AgentCard, path: str = AGENT_CARD_WELL_KNOWN_PATH) -> Route:
+    # Serves the card like A2AStarletteApplication, plus an ETag so an unchanged card costs a 304.
+    # Put it before the A2A routes so it takes precedence over theirs.
+
+    content = agent_card.model_dump(exclude_none=True, by_alias=True)
+    etag = '"' + hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()[:32] + '"'
+
+    async def get_agent_card(request: Request) -> Response:
+        if etag in [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]:
+            return Response(status_code=304, headers={'ETag': etag})
+        return JSONResponse(content, headers={'ETag': etag})
+
+    return Route(path=path, methods=['GET'], endpoint=get_agent_card)
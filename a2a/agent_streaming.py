@@ -0,0 +1,37 @@
+""" Forwarding of streamed Foundry responses as A2A status updates, shared by the title and outline agents """
+
+import time
+from collections.abc import AsyncIterator
+
+from a2a.server.tasks import TaskUpdater
+from a2a.types import Message, TaskState
+from a2a.utils import new_agent_text_message
+
+# Deltas are grouped so a fast model does not emit one event per token
+STREAM_FLUSH_INTERVAL = 0.1
+
+
+async def stream_response(deltas: AsyncIterator[str], context_id: str, task_updater: TaskUpdater,
+                          flush_interval: float = STREAM_FLUSH_INTERVAL) -> str:
+    # Forward text deltas as working status updates, batched per flush_interval, and return the full text
+
+    chunks, pending = [], []
+    last_flush = time.monotonic()
+    async for delta in deltas:
+        chunks.append(delta)
+        pending.append(delta)
+        if time.monotonic() - last_flush >= flush_interval:
+            await task_updater.update_status(TaskState.working, message=new_agent_delta_message(''.join(pending), context_id))
+            pending.clear()
+            last_flush = time.monotonic()
+
+    if pending:
+        await task_updater.update_status(TaskState.working, message=new_agent_delta_message(''.join(pending), context_id))
+    return ''.join(chunks)
+
+
+def new_agent_delta_message(text: str, context_id: str) -> Message:
+    # A partial response, marked so clients can tell it apart from progress messages
+    message = new_agent_text_message(text, context_id=context_id)
+    message.metadata = {'delta': True}
+    return message
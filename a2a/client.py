@@ -1,20 +1,39 @@
-""" Client code that connects to the routing agent """
+""" Client code that connects to the routing agent
+
+Interactive:
+    python client.py
+Load test, e.g. 20 virtual users at 5 requests per second for one minute:
+    python client.py --load-test prompts.txt --users 20 --rps 5 --duration 60 --output load_test.json
+"""
 
 import os
+import json
+import argparse
 import asyncio
-import requests
+import math
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
 server = os.environ["SERVER_URL"]
 port = os.environ["ROUTING_AGENT_PORT"]
+stream_responses = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+
+# Model runs take seconds, only connecting should fail fast
+TIMEOUT = httpx.Timeout(connect=5.0, read=300.0, write=10.0, pool=None)
 
-def send_prompt(prompt: str):
+async def send_prompt(client: httpx.AsyncClient, prompt: str, conversation_id: str | None = None):
     url = f"http://{server}:{port}/message"
-    payload = {"message": prompt}
+    payload = {"message": prompt, "conversation_id": conversation_id}
     try:
-        response = requests.post(url, json=payload)
+        response = await client.post(url, json=payload)
         if response.status_code == 200:
             return response.json().get("response", "No response from agent.")
         else:
@@ -22,15 +41,204 @@ def send_prompt(prompt: str):
     except Exception as e:
         return f"Request failed: {e}"
 
+async def stream_prompt(client: httpx.AsyncClient, prompt: str, conversation_id: str | None = None):
+    # Print the reply as it is generated, with the remote agents' progress
+    url = f"http://{server}:{port}/message/stream"
+    payload = {"message": prompt, "conversation_id": conversation_id}
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                print(f"Error {response.status_code}: {response.text}")
+                return
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event == "agent_status":
+                        print(f"\n  [{data['agent']}] {data['text']}", flush=True)
+                    elif event == "delta":
+                        print(data["text"], end="", flush=True)
+                    elif event == "done":
+                        print()
+                    elif event == "error":
+                        print(f"\nError: {data['error']}")
+    except Exception as e:
+        print(f"Request failed: {e}")
+
 async def main():
     print("Enter a prompt for the agent. Type 'quit' to exit.")
-    while True:
-        user_input = input("User: ")
-        if user_input.lower() == "quit":
-            print("Goodbye!")
-            break
-        response = send_prompt(user_input)
-        print(f"Agent: {response}")
+    # Keep the routing agent's context across prompts of this session
+    conversation_id = str(uuid.uuid4())
+    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
+        while True:
+            user_input = await asyncio.to_thread(input, "User: ")
+            if user_input.lower() == "quit":
+                print("Goodbye!")
+                break
+            if stream_responses:
+                print("Agent: ", end="", flush=True)
+                await stream_prompt(client, user_input, conversation_id)
+            else:
+                response = await send_prompt(client, user_input, conversation_id)
+                print(f"Agent: {response}")
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+async def load_test(prompts: list[str], users: int, rps: float | None, duration: float,
+                    max_requests: int | None, sticky_conversations: bool) -> dict:
+    """Send prompts to /message from `users` virtual users and measure latency and errors.
+
+    With `rps`, requests are scheduled at that rate (open loop) and handed to the
+    first idle user; if all users are busy the request waits, and the time it
+    waited is reported as schedule lag. Without it, each user sends its next
+    prompt as soon as the previous reply arrives (closed loop).
+    """
+    url = f"http://{server}:{port}/message"
+    latencies: list[float] = []
+    lags: list[float] = []
+    errors: Counter = Counter()
+    slots: asyncio.Queue = asyncio.Queue()
+    issued = 0
+    started_at = datetime.now(timezone.utc).isoformat()
+    deadline = time.perf_counter() + duration
+
+    async def schedule():
+        # Put one request slot per 1/rps seconds, stamped with its due time
+        next_due = time.perf_counter()
+        sent = 0
+        while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+            await slots.put(next_due)
+            sent += 1
+            next_due += 1 / rps
+            await asyncio.sleep(max(0.0, next_due - time.perf_counter()))
+        for _ in range(users):
+            await slots.put(None)
+
+    async def virtual_user(client: httpx.AsyncClient):
+        nonlocal issued
+        conversation_id = str(uuid.uuid4()) if sticky_conversations else None
+        while True:
+            if rps:
+                due = await slots.get()
+                if due is None:
+                    return
+                lags.append(time.perf_counter() - due)
+            elif time.perf_counter() >= deadline or (max_requests is not None and issued >= max_requests):
+                return
+            issued += 1
+
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json={"message": random.choice(prompts), "conversation_id": conversation_id})
+                if response.status_code != 200:
+                    errors[f"http_{response.status_code}"] += 1
+                elif "error" in response.json():
+                    # The routing server reports failures in the body
+                    errors["server_error"] += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+
+    async def coalescing_metrics(client: httpx.AsyncClient) -> dict | None:
+        # Requests the server answered by sharing another identical request's run
+        try:
+            response = await client.get(f"http://{server}:{port}/metrics/coalescing")
+            return response.json() if response.status_code == 200 else None
+        except Exception:
+            return None
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(timeout=TIMEOUT, limits=limits) as client:
+        coalescing_before = await coalescing_metrics(client)
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(virtual_user(client)) for _ in range(users)]
+        if rps:
+            tasks.append(asyncio.create_task(schedule()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        coalescing_after = await coalescing_metrics(client)
+
+    coalesced = None
+    if coalescing_before and coalescing_after and coalescing_after.get("enabled"):
+        coalesced = coalescing_after["coalesced"] - coalescing_before["coalesced"]
+
+    latencies.sort()
+    lags.sort()
+    total = len(latencies) + sum(errors.values())
+    return {
+        "started_at": started_at,
+        "url": url,
+        "users": users,
+        "target_rps": rps,
+        "duration_seconds": round(elapsed, 3),
+        "requests": total,
+        "successful": len(latencies),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "errors_by_kind": dict(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_seconds": {
+            "mean": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        # None when the server does not coalesce requests; counts requests of other clients too
+        "coalesced_requests": coalesced,
+        "schedule_lag_seconds": {
+            "p50": round(percentile(lags, 0.50), 3),
+            "p99": round(percentile(lags, 0.99), 3),
+        } if rps else None,
+    }
+
+def run_load_test(args):
+    with open(args.load_test, encoding="utf-8") as f:
+        prompts = [line.strip() for line in f if line.strip()]
+    if not prompts:
+        raise SystemExit(f"No prompts found in {args.load_test}")
+
+    report = asyncio.run(load_test(prompts, args.users, args.rps, args.duration, args.requests, args.sticky_conversations))
+    report["prompt_file"] = args.load_test
+
+    latency = report["latency_seconds"]
+    print(f"Requests: {report['requests']} ({report['successful']} ok, {report['errors']} errors, "
+          f"error rate {report['error_rate']:.2%})")
+    print(f"Throughput: {report['throughput_rps']} req/s over {report['duration_seconds']}s")
+    print(f"Latency: p50 {latency['p50']}s, p95 {latency['p95']}s, p99 {latency['p99']}s, max {latency['max']}s")
+    if report["coalesced_requests"]:
+        print(f"Coalesced: {report['coalesced_requests']} requests shared the run of an identical in-flight request "
+              f"(server-side REQUEST_COALESCING is enabled)")
+    if report["errors_by_kind"]:
+        print(f"Errors: {report['errors_by_kind']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.output}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Chat with the routing agent, or load test it")
+    parser.add_argument("--load-test", metavar="PROMPT_FILE", help="Run a load test with the prompts of this file, one per line")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users (default: 10)")
+    parser.add_argument("--rps", type=float, help="Target requests per second (default: as fast as the users go)")
+    parser.add_argument("--duration", type=float, default=60, help="Test duration in seconds (default: 60)")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--sticky-conversations", action="store_true",
+                        help="Give each virtual user one conversation instead of one-off messages")
+    parser.add_argument("--output", "-o", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.load_test:
+        run_load_test(args)
+    else:
+        asyncio.run(main())
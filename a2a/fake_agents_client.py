@@ -0,0 +1,483 @@
+""" In-process stand-in for the async Azure AI Foundry AgentsClient, selected with FOUNDRY_BACKEND=fake
+
+Implements the agents, threads, messages and runs operations used by the title,
+outline and routing agents, without network access. Responses are deterministic
+(derived from a hash of the agent name and the prompt) and every call sleeps for
+a latency sampled from a configurable distribution:
+
+    FAKE_FOUNDRY_API_LATENCY    control plane calls (create thread, add message...)   default const:0.02
+    FAKE_FOUNDRY_RUN_LATENCY    time before a run starts producing output              default lognormal:0.5:0.3
+    FAKE_FOUNDRY_TOKEN_LATENCY  time between streamed words                            default const:0.01
+    FAKE_FOUNDRY_RESPONSE_WORDS words in a response                                    default 40
+    FAKE_FOUNDRY_SEED           seed of the latency samples                            default 0
+
+Distributions are const:X, uniform:A:B, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA or exp:MEAN (seconds).
+
+An agent created with a send_message function tool behaves like the routing
+agent: its first run step asks to call send_message for each agent listed in its
+instructions whose name matches the prompt (all of them if none does), and the
+final answer joins the texts found in the tool outputs.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+
+from azure.ai.agents.models import (
+    AgentStreamEvent,
+    ListSortOrder,
+    MessageDelta,
+    MessageDeltaChunk,
+    MessageDeltaTextContent,
+    MessageDeltaTextContentObject,
+    MessageRole,
+    RequiredFunctionToolCall,
+    RequiredFunctionToolCallDetails,
+    SubmitToolOutputsAction,
+    SubmitToolOutputsDetails,
+    ThreadRun,
+)
+from azure.core.async_paging import AsyncItemPaged, AsyncList
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+WORDS = (
+    'agents', 'azure', 'blueprint', 'cloud', 'concise', 'context', 'data', 'design', 'efficient', 'essential',
+    'foundry', 'guide', 'insights', 'journey', 'key', 'lessons', 'modern', 'patterns', 'practical', 'principles',
+    'quick', 'reliable', 'roadmap', 'scalable', 'secrets', 'simple', 'smart', 'steps', 'strategies', 'systems',
+    'tips', 'tools', 'unlocking', 'workflow', 'building', 'scaling', 'streaming', 'routing', 'caching', 'testing',
+)
+
+
+class LatencyDistribution:
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, *values = spec.split(':')
+        self.kind = kind
+        self.values = [float(value) for value in values]
+        expected = {'const': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exp': 1}
+        if expected.get(kind) != len(self.values):
+            raise ValueError(f"Invalid latency distribution '{spec}'")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'const':
+            return self.values[0]
+        if self.kind == 'uniform':
+            return rng.uniform(*self.values)
+        if self.kind == 'normal':
+            return max(0.0, rng.gauss(*self.values))
+        if self.kind == 'lognormal':
+            return rng.lognormvariate(math.log(self.values[0]), self.values[1])
+        return rng.expovariate(1 / self.values[0])
+
+
+@dataclass
+class _Agent:
+    id: str
+    name: str
+    model: str
+    instructions: str
+    tools: list = field(default_factory=list)
+
+
+@dataclass
+class _Thread:
+    id: str
+    metadata: dict | None
+    created_at: datetime
+    messages: list = field(default_factory=list)
+    active_run: str | None = None
+
+
+@dataclass
+class _Text:
+    value: str
+    annotations: list = field(default_factory=list)
+
+
+@dataclass
+class _TextMessage:
+    text: _Text
+
+
+@dataclass
+class _Message:
+    id: str
+    thread_id: str
+    role: str
+    content: str
+
+    @property
+    def text_messages(self) -> list[_TextMessage]:
+        return [_TextMessage(_Text(self.content))]
+
+
+@dataclass
+class _Run:
+    id: str
+    thread_id: str
+    agent_id: str
+    status: str = 'queued'
+    ready_at: float = 0.0
+    tool_outputs: list | None = None
+    required_action: Any = None
+
+
+class _Operations:
+
+    def __init__(self, client: 'FakeAgentsClient'):
+        self._client = client
+
+
+class _ThreadsOperations(_Operations):
+
+    async def create(self, *, metadata: dict | None = None, **kwargs) -> _Thread:
+        await self._client._api_call()
+        thread = _Thread(f'thread_{uuid.uuid4().hex}', metadata, datetime.now(timezone.utc))
+        self._client._threads[thread.id] = thread
+        return thread
+
+    async def update(self, thread_id: str, *, metadata: dict | None = None, **kwargs) -> _Thread:
+        await self._client._api_call()
+        thread = self._client._thread(thread_id)
+        if metadata is not None:
+            thread.metadata = metadata
+        return thread
+
+    async def delete(self, thread_id: str, **kwargs) -> None:
+        await self._client._api_call()
+        if self._client._threads.pop(thread_id, None) is None:
+            raise ResourceNotFoundError(f'No thread found with id {thread_id}')
+
+    def list(self, *, limit: int = 20, order: str = ListSortOrder.DESCENDING, **kwargs) -> AsyncItemPaged:
+        # Paged like the SDK: the continuation token is the ID of the last thread of the previous page
+
+        async def get_next(after: str | None = None) -> list[_Thread]:
+            await self._client._api_call()
+            threads = list(self._client._threads.values())
+            if ListSortOrder(order) == ListSortOrder.DESCENDING:
+                threads.reverse()
+            ids = [thread.id for thread in threads]
+            start = ids.index(after) + 1 if after in ids else 0
+            return threads[start:start + limit]
+
+        async def extract_data(page: list[_Thread]):
+            return (page[-1].id if page else None), AsyncList(page)
+
+        return AsyncItemPaged(get_next, extract_data)
+
+
+class _MessagesOperations(_Operations):
+
+    async def create(self, thread_id: str, role: str, content: str, **kwargs) -> _Message:
+        await self._client._api_call()
+        thread = self._client._thread(thread_id)
+        if thread.active_run:
+            raise HttpResponseError(message=f'Thread {thread_id} already has an active run {thread.active_run}')
+        message = _Message(f'msg_{uuid.uuid4().hex}', thread_id, role, content)
+        thread.messages.append(message)
+        return message
+
+    async def list(self, thread_id: str, order: str = ListSortOrder.DESCENDING, **kwargs) -> AsyncIterator[_Message]:
+        await self._client._api_call()
+        messages = list(self._client._thread(thread_id).messages)
+        for message in (reversed(messages) if ListSortOrder(order) == ListSortOrder.DESCENDING else messages):
+            yield message
+
+
+class _RunsOperations(_Operations):
+
+    async def create(self, thread_id: str, agent_id: str, **kwargs) -> ThreadRun:
+        await self._client._api_call()
+        run = self._client._start_run(thread_id, agent_id)
+        return self._client._as_thread_run(run)
+
+    async def get(self, thread_id: str, run_id: str, **kwargs) -> ThreadRun:
+        await self._client._api_call()
+        run = self._client._runs[run_id]
+        self._client._advance(run)
+        return self._client._as_thread_run(run)
+
+    async def submit_tool_outputs(self, thread_id: str, run_id: str, *, tool_outputs: list, **kwargs) -> ThreadRun:
+        await self._client._api_call()
+        run = self._client._resume(run_id, tool_outputs)
+        return self._client._as_thread_run(run)
+
+    async def stream(self, thread_id: str, agent_id: str, **kwargs) -> '_FakeRunStream':
+        await self._client._api_call()
+        run = self._client._start_run(thread_id, agent_id)
+        return _FakeRunStream(self._client._stream_events(run))
+
+    async def submit_tool_outputs_stream(self, thread_id: str, run_id: str, *, tool_outputs: list,
+                                         event_handler: '_FakeEventHandler', **kwargs) -> None:
+        await self._client._api_call()
+        run = self._client._resume(run_id, tool_outputs)
+        event_handler.initialize(self._client._stream_events(run))
+
+
+class _FakeEventHandler:
+    # Iterates (event type, event data, None) like AsyncAgentEventHandler
+
+    def __init__(self, events: AsyncIterator[tuple]):
+        self.initialize(events)
+
+    def initialize(self, events: AsyncIterator[tuple]) -> None:
+        self._events = events
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> tuple:
+        return await self._events.__anext__()
+
+
+class _FakeRunStream:
+
+    def __init__(self, events: AsyncIterator[tuple]):
+        self._handler = _FakeEventHandler(events)
+
+    async def __aenter__(self) -> _FakeEventHandler:
+        return self._handler
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+
+class FakeAgentsClient:
+    """Drop-in for azure.ai.agents.aio.AgentsClient, limited to what the a2a agents use"""
+
+    def __init__(self, api_latency: str = 'const:0.02', run_latency: str = 'lognormal:0.5:0.3',
+                 token_latency: str = 'const:0.01', response_words: int = 40, seed: int = 0):
+        self.api_latency = LatencyDistribution(api_latency)
+        self.run_latency = LatencyDistribution(run_latency)
+        self.token_latency = LatencyDistribution(token_latency)
+        self.response_words = response_words
+        self._rng = random.Random(seed)
+
+        self._agents: dict[str, _Agent] = {}
+        self._threads: dict[str, _Thread] = {}
+        self._runs: dict[str, _Run] = {}
+
+        self.threads = _ThreadsOperations(self)
+        self.messages = _MessagesOperations(self)
+        self.runs = _RunsOperations(self)
+
+    @classmethod
+    def from_env(cls) -> 'FakeAgentsClient':
+        return cls(
+            api_latency=os.getenv('FAKE_FOUNDRY_API_LATENCY', 'const:0.02'),
+            run_latency=os.getenv('FAKE_FOUNDRY_RUN_LATENCY', 'lognormal:0.5:0.3'),
+            token_latency=os.getenv('FAKE_FOUNDRY_TOKEN_LATENCY', 'const:0.01'),
+            response_words=int(os.getenv('FAKE_FOUNDRY_RESPONSE_WORDS', '40')),
+            seed=int(os.getenv('FAKE_FOUNDRY_SEED', '0')),
+        )
+
+    # Agents
+
+    async def create_agent(self, *, model: str, name: str, instructions: str = '', tools: list | None = None, **kwargs) -> _Agent:
+        await self._api_call()
+        agent = _Agent(f'asst_{uuid.uuid4().hex}', name, model, instructions, list(tools or []))
+        self._agents[agent.id] = agent
+        return agent
+
+    async def update_agent(self, agent_id: str, *, instructions: str | None = None, **kwargs) -> _Agent:
+        await self._api_call()
+        agent = self._agents[agent_id]
+        if instructions is not None:
+            agent.instructions = instructions
+        return agent
+
+    async def delete_agent(self, agent_id: str, **kwargs) -> None:
+        await self._api_call()
+        self._agents.pop(agent_id, None)
+
+    async def close(self) -> None:
+        pass
+
+    # Run simulation
+
+    async def _api_call(self) -> None:
+        await asyncio.sleep(self.api_latency.sample(self._rng))
+
+    def _thread(self, thread_id: str) -> _Thread:
+        if thread_id not in self._threads:
+            raise ResourceNotFoundError(f'No thread found with id {thread_id}')
+        return self._threads[thread_id]
+
+    def _start_run(self, thread_id: str, agent_id: str) -> _Run:
+        thread = self._thread(thread_id)
+        if thread.active_run:
+            raise HttpResponseError(message=f'Thread {thread_id} already has an active run {thread.active_run}')
+        run = _Run(f'run_{uuid.uuid4().hex}', thread_id, agent_id, ready_at=time.monotonic() + self._run_duration())
+        thread.active_run = run.id
+        self._runs[run.id] = run
+        return run
+
+    def _resume(self, run_id: str, tool_outputs: list) -> _Run:
+        run = self._runs[run_id]
+        if run.status != 'requires_action':
+            raise HttpResponseError(message=f'Run {run_id} is {run.status}, not requires_action')
+        run.tool_outputs = list(tool_outputs)
+        run.required_action = None
+        run.status = 'in_progress'
+        run.ready_at = time.monotonic() + self._run_duration()
+        return run
+
+    def _run_duration(self) -> float:
+        # Polling clients see the run finish when the streamed words would have been sent
+        return self.run_latency.sample(self._rng) + sum(
+            self.token_latency.sample(self._rng) for _ in range(self.response_words)
+        )
+
+    def _advance(self, run: _Run) -> None:
+        # Move a polled run forward according to the clock
+        if run.status in ('completed', 'failed', 'requires_action'):
+            return
+        if time.monotonic() < run.ready_at:
+            run.status = 'in_progress'
+            return
+        tool_calls = self._tool_calls(run)
+        if tool_calls:
+            self._require_action(run, tool_calls)
+        else:
+            self._complete(run, self._response(run))
+
+    def _require_action(self, run: _Run, tool_calls: list[RequiredFunctionToolCall]) -> None:
+        run.status = 'requires_action'
+        run.required_action = SubmitToolOutputsAction(
+            submit_tool_outputs=SubmitToolOutputsDetails(tool_calls=tool_calls)
+        )
+
+    def _complete(self, run: _Run, response: str) -> None:
+        thread = self._thread(run.thread_id)
+        thread.messages.append(_Message(f'msg_{uuid.uuid4().hex}', thread.id, MessageRole.AGENT, response))
+        thread.active_run = None
+        run.status = 'completed'
+
+    async def _stream_events(self, run: _Run) -> AsyncIterator[tuple]:
+        yield AgentStreamEvent.THREAD_RUN_IN_PROGRESS, self._as_thread_run(run, 'in_progress'), None
+        await asyncio.sleep(self.run_latency.sample(self._rng))
+
+        tool_calls = self._tool_calls(run)
+        if tool_calls:
+            self._require_action(run, tool_calls)
+            yield AgentStreamEvent.THREAD_RUN_REQUIRES_ACTION, self._as_thread_run(run), None
+            yield AgentStreamEvent.DONE, '[DONE]', None
+            return
+
+        response = self._response(run)
+        message_id = f'msg_{uuid.uuid4().hex}'
+        for position, word in enumerate(response.split(' ')):
+            await asyncio.sleep(self.token_latency.sample(self._rng))
+            delta = MessageDeltaChunk(id=message_id, delta=MessageDelta(
+                role=MessageRole.AGENT,
+                content=[MessageDeltaTextContent(index=0, text=MessageDeltaTextContentObject(
+                    value=word if position == 0 else ' ' + word
+                ))]
+            ))
+            yield AgentStreamEvent.THREAD_MESSAGE_DELTA, delta, None
+
+        self._complete(run, response)
+        yield AgentStreamEvent.THREAD_RUN_COMPLETED, self._as_thread_run(run), None
+        yield AgentStreamEvent.DONE, '[DONE]', None
+
+    def _as_thread_run(self, run: _Run, status: str | None = None) -> ThreadRun:
+        return ThreadRun(
+            id=run.id,
+            thread_id=run.thread_id,
+            agent_id=run.agent_id,
+            status=status or run.status,
+            required_action=run.required_action,
+            last_error=None,
+        )
+
+    # Deterministic behavior
+
+    def _tool_calls(self, run: _Run) -> list[RequiredFunctionToolCall]:
+        # The routing agent delegates once per run, before any tool output
+        agent = self._agents[run.agent_id]
+        if run.tool_outputs is not None or not _has_function(agent, 'send_message'):
+            return []
+
+        prompt = self._last_user_message(run)
+        agents = _listed_agents(agent.instructions)
+        words = set(prompt.lower().split())
+        selected = [name for name in agents if _keywords(name) & words] or agents
+        return [
+            RequiredFunctionToolCall(
+                id=f'call_{uuid.uuid4().hex[:24]}',
+                function=RequiredFunctionToolCallDetails(
+                    name='send_message',
+                    arguments=json.dumps({'agent_name': name, 'task': prompt})
+                )
+            )
+            for name in selected
+        ]
+
+    def _response(self, run: _Run) -> str:
+        if run.tool_outputs is not None:
+            return '\n\n'.join(_output_text(output['output']) for output in run.tool_outputs)
+
+        agent = self._agents[run.agent_id]
+        prompt = self._last_user_message(run)
+        digest = hashlib.sha256(f'{agent.name}\n{prompt}'.encode('utf-8')).digest()
+        generator = random.Random(digest)
+        words = [generator.choice(WORDS) for _ in range(self.response_words)]
+        words[0] = words[0].capitalize()
+        return ' '.join(words) + '.'
+
+    def _last_user_message(self, run: _Run) -> str:
+        for message in reversed(self._thread(run.thread_id).messages):
+            if message.role != MessageRole.AGENT:
+                return message.content
+        return ''
+
+
+def _has_function(agent: _Agent, name: str) -> bool:
+    for tool in agent.tools:
+        function = tool.get('function') if isinstance(tool, dict) else getattr(tool, 'function', None)
+        function_name = function.get('name') if isinstance(function, dict) else getattr(function, 'name', None)
+        if function_name == name:
+            return True
+    return False
+
+
+def _listed_agents(instructions: str) -> list[str]:
+    # The routing agent lists its agents as "Available Agents: [\n  name: description,\n ...]"
+    _, _, listing = instructions.partition('Available Agents:')
+    listing = listing.partition('[')[2].partition('\n]')[0]
+    return [line.strip().partition(': ')[0] for line in listing.split(',\n') if ': ' in line]
+
+
+def _keywords(agent_name: str) -> set[str]:
+    return {word for word in agent_name.lower().split() if word not in ('ai', 'foundry', 'agent')}
+
+
+def _output_text(output: str) -> str:
+    # Tool outputs are A2A events serialized as JSON, use the last text part they contain
+    try:
+        data = json.loads(output)
+    except ValueError:
+        return output
+    texts = []
+
+    def collect(value):
+        if isinstance(value, dict):
+            if isinstance(value.get('text'), str):
+                texts.append(value['text'])
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    collect(data)
+    return texts[-1] if texts else output
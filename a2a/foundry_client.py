@@ -0,0 +1,24 @@
+""" Creates the async Azure AI Foundry agents client, or its in-process fake when FOUNDRY_BACKEND=fake """
+
+import os
+
+from azure.ai.agents.aio import AgentsClient
+from azure.identity.aio import DefaultAzureCredential
+
+
+def create_agents_client() -> tuple[AgentsClient, DefaultAzureCredential | None]:
+    # Returns the client and the credential to close with it, None for the fake
+    backend = os.getenv('FOUNDRY_BACKEND', 'azure').lower()
+    if backend == 'fake':
+        # Runs the agents without Azure, e.g. to load test the A2A plumbing
+        from fake_agents_client import FakeAgentsClient
+        print('Using the in-process fake Azure AI Foundry agents client')
+        return FakeAgentsClient.from_env(), None
+    if backend != 'azure':
+        raise ValueError(f"Unknown FOUNDRY_BACKEND '{backend}', expected 'azure' or 'fake'")
+
+    credential = DefaultAzureCredential(
+        exclude_environment_credential=True,
+        exclude_managed_identity_credential=True
+    )
+    return AgentsClient(endpoint=os.environ['PROJECT_ENDPOINT'], credential=credential), credential
@@ -0,0 +1,183 @@
+""" Pool of pre-created Azure AI Foundry threads shared by the title and outline agents """
+
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from azure.ai.agents.aio import AgentsClient
+from azure.ai.agents.models import ListSortOrder
+
+
+class _PooledThread:
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.created = time.monotonic()
+
+
+class FoundryThreadPool:
+    """Pre-created threads, each used by one request and then deleted.
+
+    Creating the thread is taken off the request path, not the thread reused:
+    messages cannot be deleted, so a reused thread would keep the previous
+    user's messages. A returned thread is deleted, and replaced, in the background.
+
+    Threads are tagged with `{"pool": name, "pool_id": ..., "heartbeat": ...}`
+    metadata, where `pool_id` is unique to this process and `heartbeat` is
+    refreshed by every janitor sweep. The janitor retires idle threads beyond
+    `size` or older than `max_thread_age`, and deletes threads of the same pool
+    name whose owner stopped refreshing them, e.g. left over by a process that
+    crashed. Threads of other live processes (replicas, uvicorn workers) keep a
+    fresh heartbeat and are left alone.
+    """
+
+    def __init__(self, client: AgentsClient, name: str, size: int = 4, max_thread_age: float = 3600,
+                  janitor_interval: float = 300, max_listed_threads: int = 500):
+        self.client = client
+        self.name = name
+        self.pool_id = uuid.uuid4().hex[:16]
+        self.size = size
+        self.max_thread_age = max_thread_age
+        self.janitor_interval = janitor_interval
+        # A heartbeat missing for several sweeps means its process is gone
+        self.stale_after = 3 * janitor_interval
+        # The janitor lists at most about this many project threads per sweep, resuming from the cursor
+        self.max_listed_threads = max_listed_threads
+        self._list_cursor: str | None = None
+
+        self._idle: list[_PooledThread] = []
+        self._creating = 0
+        self._owned: set[str] = set()
+        self._background: set[asyncio.Task] = set()
+        self._janitor: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        # Create the initial threads concurrently and start the janitor
+        threads = await asyncio.gather(*(self._create() for _ in range(self.size)))
+        self._idle.extend(threads)
+        self._janitor = asyncio.create_task(self._run_janitor())
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[str]:
+        # Yield the ID of a thread no request used before; a new one is created if none is idle
+
+        entry = self._idle.pop() if self._idle else await self._create()
+        try:
+            yield entry.thread_id
+        finally:
+            self._in_background(self._delete(entry.thread_id))
+            self._refill()
+
+    def _metadata(self) -> dict[str, str]:
+        return {"pool": self.name, "pool_id": self.pool_id, "heartbeat": str(int(time.time()))}
+
+    async def _create(self) -> _PooledThread:
+        thread = await self.client.threads.create(metadata=self._metadata())
+        self._owned.add(thread.id)
+        return _PooledThread(thread.id)
+
+    async def _heartbeat(self, thread_id: str) -> None:
+        try:
+            await self.client.threads.update(thread_id, metadata=self._metadata())
+        except Exception as e:
+            print(f'WARNING: Failed to refresh thread {thread_id}: {e}')
+
+    def _refill(self) -> None:
+        # Top the idle threads back up to `size` in the background
+        while len(self._idle) + self._creating < self.size:
+            self._creating += 1
+            self._in_background(self._replace())
+
+    async def _replace(self) -> None:
+        try:
+            self._idle.append(await self._create())
+        except Exception as e:
+            print(f'WARNING: Failed to create a pooled thread: {e}')
+        finally:
+            self._creating -= 1
+
+    async def _delete(self, thread_id: str) -> None:
+        self._owned.discard(thread_id)
+        try:
+            await self.client.threads.delete(thread_id)
+        except Exception as e:
+            print(f'WARNING: Failed to delete thread {thread_id}: {e}')
+
+    def _in_background(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _run_janitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.janitor_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f'WARNING: Thread janitor failed: {e}')
+
+    async def sweep(self) -> int:
+        # Retire surplus and old idle threads, refresh the heartbeat of the others and delete
+        # abandoned ones, returning how many were deleted
+
+        deleted = 0
+        while len(self._idle) > self.size:
+            await self._delete(self._idle.pop(0).thread_id)
+            deleted += 1
+
+        # Under light load the bottom of the idle stack is never leased, so it is renewed here
+        now = time.monotonic()
+        expired = [entry for entry in self._idle if now - entry.created > self.max_thread_age]
+        for entry in expired:
+            self._idle.remove(entry)
+            await self._delete(entry.thread_id)
+            deleted += 1
+        self._refill()
+
+        await asyncio.gather(*(self._heartbeat(thread_id) for thread_id in list(self._owned)))
+
+        # The list covers the whole project: each sweep pages through about max_listed_threads threads,
+        # oldest first, and the next one resumes after the last thread kept, so every thread is reached
+        listed = 0
+        now = time.time()
+        cursor, self._list_cursor = self._list_cursor, None
+        try:
+            pages = self.client.threads.list(limit=100, order=ListSortOrder.ASCENDING).by_page(continuation_token=cursor)
+            async for page in pages:
+                async for thread in page:
+                    listed += 1
+                    if thread.id not in self._owned and self._abandoned(thread.metadata or {}, thread.created_at, now):
+                        await self._delete(thread.id)
+                        deleted += 1
+                    else:
+                        cursor = thread.id
+                if listed >= self.max_listed_threads:
+                    self._list_cursor = cursor
+                    break
+        finally:
+            if deleted:
+                print(f'{self.name}: thread janitor deleted {deleted} thread(s)')
+        return deleted
+
+    def _abandoned(self, metadata: dict, created_at: datetime, now: float) -> bool:
+        if metadata.get("pool") != self.name or metadata.get("pool_id") == self.pool_id:
+            return False
+        if "heartbeat" in metadata:
+            try:
+                return now - float(metadata["heartbeat"]) > self.stale_after
+            except ValueError:
+                pass
+        # Threads tagged before heartbeats existed only have their creation time
+        return (datetime.now(timezone.utc) - created_at).total_seconds() > 2 * self.max_thread_age
+
+    async def close(self) -> None:
+        # Stop the janitor and delete every idle thread
+        if self._janitor:
+            self._janitor.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(self._delete(entry.thread_id) for entry in idle))
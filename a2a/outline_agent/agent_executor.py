@@ -7,6 +7,8 @@ from a2a.server.tasks import TaskUpdater
 from a2a.types import AgentCard, Part, TaskState
 from a2a.utils.message import new_agent_text_message
 from outline_agent.agent import OutlineAgent, create_foundry_outline_agent
+from response_cache import create_response_cache
+from agent_streaming import stream_response
 
 # An AgentExecutor that runs Azure AI Foundry-based agents. Adapted from the ADK agent executor pattern.
 class OutlineAgentExecutor(AgentExecutor):
@@ -14,12 +16,25 @@ class OutlineAgentExecutor(AgentExecutor):
     def __init__(self, card: AgentCard):
         self._card = card
         self._foundry_agent: OutlineAgent | None = None
+        # Repeated prompts (and near-identical ones, if semantic lookups are enabled) are answered without a model run
+        self.response_cache = create_response_cache()
 
     async def _get_or_create_agent(self) -> OutlineAgent:
         if not self._foundry_agent:
             self._foundry_agent = await create_foundry_outline_agent()
         return self._foundry_agent
 
+    async def start(self) -> None:
+        # Create the Foundry agent and its thread pool before the first request arrives
+        await self._get_or_create_agent()
+
+    async def close(self) -> None:
+        print(f'Outline Agent: response cache {self.response_cache.stats()}')
+        await self.response_cache.close()
+        if self._foundry_agent:
+            await self._foundry_agent.close()
+            self._foundry_agent = None
+
     async def _process_request(self, message_parts: list[Part], context_id: str, task_updater: TaskUpdater) -> None:
         # Process a user request through the Foundry agent
 
@@ -27,6 +42,14 @@ class OutlineAgentExecutor(AgentExecutor):
             # Retrieve message from A2A parts
             user_message = message_parts[0].root.text
 
+            # Answer from the cache when the same topic was already asked
+            cached = await self.response_cache.lookup(user_message)
+            if cached.response:
+                await task_updater.complete(
+                    message=new_agent_text_message(cached.response, context_id=context_id)
+                )
+                return
+
             # Get the outline agent
             agent = await self._get_or_create_agent()
 
@@ -36,18 +59,14 @@ class OutlineAgentExecutor(AgentExecutor):
                 message=new_agent_text_message('Outline Agent is processing your request...', context_id=context_id)
             )
 
-            # Run the conversation
-            responses = await agent.run_conversation(user_message)
+            # Run the conversation, forwarding the outline as it is generated
+            response = await stream_response(agent.stream_conversation(user_message), context_id, task_updater)
 
-            # Update the task with responses
-            for response in responses:
-                await task_updater.update_status(
-                    TaskState.working,
-                    message=new_agent_text_message( response, context_id=context_id)
-                )
+            if response:
+                self.response_cache.store(user_message, response, cached.embedding)
 
             # Mark the task as complete
-            final_message = responses[-1] if responses else 'Task completed.'
+            final_message = response or 'No response received'
             await task_updater.complete(
                 message=new_agent_text_message(final_message, context_id=context_id)
             )
@@ -1,15 +1,17 @@
 import os
 import uvicorn
+from contextlib import asynccontextmanager
 
 from a2a.server.apps import A2AStarletteApplication
 from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
 from a2a.types import AgentCapabilities, AgentCard, AgentSkill
 from dotenv import load_dotenv
 from outline_agent.agent_executor import create_foundry_agent_executor
+from task_stores import create_task_store
+from agent_card_route import agent_card_route
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import PlainTextResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from starlette.routing import Route
 
 load_dotenv()
@@ -48,7 +50,7 @@ agent_executor = create_foundry_agent_executor(agent_card)
 
 # Create request handler
 request_handler = DefaultRequestHandler(
-    agent_executor=agent_executor, task_store=InMemoryTaskStore()
+    agent_executor=agent_executor, task_store=create_task_store('outline_agent')
 )
 
 # Create A2A application
@@ -56,8 +58,8 @@ a2a_app = A2AStarletteApplication(
     agent_card=agent_card, http_handler=request_handler
 )
 
-# Get routes
-routes = a2a_app.routes()
+# Get routes, with the agent card served with an ETag
+routes = [agent_card_route(agent_card)] + a2a_app.routes()
 
 # Add health check endpoint
 async def health_check(request: Request) -> PlainTextResponse:
@@ -65,8 +67,21 @@ async def health_check(request: Request) -> PlainTextResponse:
 
 routes.append(Route(path='/health', methods=['GET'], endpoint=health_check))
 
+# Add response cache statistics endpoint (hit rates)
+async def cache_stats(request: Request) -> JSONResponse:
+    return JSONResponse(agent_executor.response_cache.stats())
+
+routes.append(Route(path='/cache/stats', methods=['GET'], endpoint=cache_stats))
+
+# Create the Foundry agent at startup rather than on the first request
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    await agent_executor.start()
+    yield
+    await agent_executor.close()
+
 # Create Starlette app
-app = Starlette(routes=routes)
+app = Starlette(routes=routes, lifespan=lifespan)
 
 def main():
     # Run the server
@@ -0,0 +1,191 @@
+""" Exact and semantic response cache for the title and outline agents """
+
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import numpy as np
+
+Embedder = Callable[[str], Awaitable[list[float]]]
+
+
+@dataclass
+class CacheLookup:
+    response: str | None
+    # Embedding of the prompt, reused by `store` after a miss
+    embedding: np.ndarray | None = None
+
+
+def normalize_prompt(text: str) -> str:
+    # Case, whitespace and trailing punctuation do not change the answer
+    return re.sub(r'\s+', ' ', text).strip().strip('.!?').strip().lower()
+
+
+class ResponseCache:
+    """LRU cache of agent responses keyed by prompt.
+
+    A lookup first tries the hash of the normalized prompt. If that misses and an
+    embedder is configured, the prompt is embedded and compared to every cached
+    prompt with one matrix-vector product; the closest one is a hit when its cosine
+    similarity reaches `similarity_threshold`.
+
+    Prompts differing only in their subject ("a title about cats" / "... dogs")
+    commonly score above 0.92 with ada-002 and text-embedding-3 models, so the
+    threshold must stay strict; semantic lookups are off unless an embedder is given.
+    """
+
+    def __init__(self, max_entries: int = 1024, similarity_threshold: float = 0.97, embed: Embedder | None = None):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+
+        # key -> (response, matrix row or None), least recently used first
+        self._entries: OrderedDict[str, tuple[str, int | None]] = OrderedDict()
+        self._matrix: np.ndarray | None = None
+        self._row_keys: list[str | None] = []
+        self._free_rows: list[int] = []
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    async def lookup(self, prompt: str) -> CacheLookup:
+        if self.max_entries <= 0:
+            return CacheLookup(None)
+
+        key = self._key(prompt)
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return CacheLookup(entry[0])
+
+        embedding = await self._embed(prompt)
+        if embedding is not None and self._matrix is not None:
+            similarities = self._matrix[:len(self._row_keys)] @ embedding
+            for row in self._free_rows:
+                similarities[row] = -1.0
+            best = int(np.argmax(similarities)) if len(similarities) else -1
+            if best >= 0 and similarities[best] >= self.similarity_threshold:
+                best_key = self._row_keys[best]
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return CacheLookup(self._entries[best_key][0], embedding)
+
+        self.misses += 1
+        return CacheLookup(None, embedding)
+
+    def store(self, prompt: str, response: str, embedding: np.ndarray | None = None) -> None:
+        if self.max_entries <= 0:
+            return
+
+        key = self._key(prompt)
+        if key in self._entries:
+            _, row = self._entries[key]
+            self._entries[key] = (response, row)
+            self._entries.move_to_end(key)
+            return
+
+        # Evict first so the new prompt always finds a free matrix row
+        while len(self._entries) >= self.max_entries:
+            _, (_, evicted_row) = self._entries.popitem(last=False)
+            if evicted_row is not None:
+                self._row_keys[evicted_row] = None
+                self._free_rows.append(evicted_row)
+
+        row = self._add_row(key, embedding) if embedding is not None else None
+        self._entries[key] = (response, row)
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'lookups': lookups,
+            'exact_hits': self.exact_hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+    async def close(self) -> None:
+        # Release the embedder's client and credential
+        close = getattr(self.embed, 'close', None)
+        if close:
+            await close()
+
+    @staticmethod
+    def _key(prompt: str) -> str:
+        return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+    async def _embed(self, prompt: str) -> np.ndarray | None:
+        if not self.embed:
+            return None
+        try:
+            vector = np.asarray(await self.embed(normalize_prompt(prompt)), dtype=np.float32)
+        except Exception as e:
+            print(f'WARNING: Embedding failed, skipping semantic lookup: {e}')
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _add_row(self, key: str, embedding: np.ndarray) -> int:
+        if self._matrix is None:
+            # Rows are unit vectors, so a dot product is the cosine similarity
+            self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_keys[row] = key
+        else:
+            row = len(self._row_keys)
+            self._row_keys.append(key)
+        self._matrix[row] = embedding
+        return row
+
+
+class AzureOpenAIEmbedder:
+    """Embeds prompts with an Azure OpenAI deployment, using the signed-in identity"""
+
+    def __init__(self, deployment: str):
+        from azure.identity.aio import DefaultAzureCredential, get_bearer_token_provider
+        from openai import AsyncAzureOpenAI
+
+        self.deployment = deployment
+        self.credential = DefaultAzureCredential(
+            exclude_environment_credential=True,
+            exclude_managed_identity_credential=True
+        )
+        self.client = AsyncAzureOpenAI(
+            azure_endpoint=os.environ['AZURE_OPENAI_ENDPOINT'],
+            azure_ad_token_provider=get_bearer_token_provider(self.credential, 'https://cognitiveservices.azure.com/.default'),
+            api_version=os.getenv('AZURE_OPENAI_API_VERSION', '2024-10-21'),
+        )
+
+    async def __call__(self, text: str) -> list[float]:
+        response = await self.client.embeddings.create(model=self.deployment, input=text)
+        return response.data[0].embedding
+
+    async def close(self) -> None:
+        await self.client.close()
+        await self.credential.close()
+
+
+def create_embedder() -> Embedder | None:
+    # Semantic lookups are opt-in: they need RESPONSE_CACHE_SIMILARITY, EMBEDDING_DEPLOYMENT_NAME and AZURE_OPENAI_ENDPOINT
+
+    deployment = os.getenv('EMBEDDING_DEPLOYMENT_NAME')
+    if not deployment or not os.getenv('RESPONSE_CACHE_SIMILARITY'):
+        return None
+    return AzureOpenAIEmbedder(deployment)
+
+
+def create_response_cache() -> ResponseCache:
+    # RESPONSE_CACHE_SIZE=0 disables the cache; without RESPONSE_CACHE_SIMILARITY only exact repeats are hits
+    return ResponseCache(
+        max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '1024')),
+        similarity_threshold=float(os.getenv('RESPONSE_CACHE_SIMILARITY', '0.97')),
+        embed=create_embedder(),
+    )
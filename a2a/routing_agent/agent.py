@@ -1,23 +1,39 @@
 import asyncio
 import json
 import os
+import random
 import time
 import uuid
 import httpx
 
 from typing import Any, Callable
-from azure.ai.agents import AgentsClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import ListSortOrder, FunctionTool, MessageRole
-from collections.abc import Callable
+from azure.ai.agents.models import (
+    AgentStreamEvent,
+    FunctionTool,
+    ListSortOrder,
+    MessageDeltaChunk,
+    MessageRole,
+    SubmitToolOutputsAction,
+    ThreadRun,
+)
+from collections.abc import AsyncIterator, Awaitable, Callable
 from dotenv import load_dotenv
-from a2a.client import A2ACardResolver, A2AClient
+from a2a.client import A2AClient, A2AClientHTTPError, A2AClientTimeoutError
+from a2a.utils import get_message_text
+from foundry_client import create_agents_client
+from routing_agent.conversation_threads import ConversationThreads
+from routing_agent.discovery import AgentCardCache, discover_agent_cards
+from routing_agent.http_pool import MeteredTransport, create_http_client
+from routing_agent.replicas import Replica, ReplicaSet, balancing_policy
 from a2a.types import (
     AgentCard,
     MessageSendParams,
     SendMessageRequest,
     SendMessageResponse,
     SendMessageSuccessResponse,
+    SendStreamingMessageRequest,
+    SendStreamingMessageResponse,
+    SendStreamingMessageSuccessResponse,
     Task,
     TaskArtifactUpdateEvent,
     TaskStatusUpdateEvent,
@@ -28,20 +44,101 @@ load_dotenv()
 TaskCallbackArg = Task | TaskStatusUpdateEvent | TaskArtifactUpdateEvent
 TaskUpdateCallback = Callable[[TaskCallbackArg, AgentCard], Task]
 
+# Receives (agent name, text, is_delta) for every progress message of a remote agent
+AgentUpdateCallback = Callable[[str, str, bool], Awaitable[None]]
+
+# Receives (event name, data) for every event of a streamed user message
+StreamEmitCallback = Callable[[str, dict], Awaitable[None]]
+
+
+def _can_fail_over(error: BaseException) -> bool:
+    # Only when the replica never got the request or refused it (5xx): a read timeout may leave a run
+    # going on the replica, and a 4xx would fail the same way anywhere. The A2A client wraps httpx errors.
+    cause = error if isinstance(error, httpx.HTTPError) else error.__cause__
+    if isinstance(cause, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(cause, httpx.HTTPStatusError):
+        return cause.response.status_code >= 500
+    return False
+
 
 class RemoteAgentConnections:
-    """A class to hold the connections to the remote agents."""
+    """A class to hold the connections to the remote agents, one per replica of an agent."""
 
-    def __init__(self, agent_card: AgentCard, agent_url: str):
-        self._httpx_client = httpx.AsyncClient(timeout=30)
-        self.agent_client = A2AClient(self._httpx_client, agent_card, url=agent_url)
+    def __init__(self, agent_card: AgentCard, agent_urls: list[str], httpx_client: httpx.AsyncClient):
+        # The httpx client is shared by every remote agent and owned by the RoutingAgent
+        self._httpx_client = httpx_client
         self.card = agent_card
+        self.replicas = ReplicaSet(agent_urls, policy=balancing_policy())
+        self._agent_clients: dict[str, A2AClient] = {}
 
     def get_agent(self) -> AgentCard:
         return self.card
 
+    def update_replicas(self, agent_urls: list[str]) -> None:
+        self.replicas.update(agent_urls)
+
+    def _agent_client(self, replica: Replica) -> A2AClient:
+        if replica.url not in self._agent_clients:
+            self._agent_clients[replica.url] = A2AClient(self._httpx_client, self.card, url=replica.url)
+        return self._agent_clients[replica.url]
+
     async def send_message(self, message_request: SendMessageRequest) -> SendMessageResponse:
-        return await self.agent_client.send_message(message_request)
+        # Retry on another replica when a call could not reach the replica or it answered 5xx
+        tried: set[str] = set()
+        last_error: Exception | None = None
+        while True:
+            replica = self.replicas.select(exclude=tried)
+            if replica is None:
+                # The replicas changed during a discovery refresh and none is left to try
+                raise last_error or RuntimeError(f'No replica available for agent {self.card.name}')
+            tried.add(replica.url)
+            replica.outstanding += 1
+            started = time.perf_counter()
+            try:
+                response = await self._agent_client(replica).send_message(message_request)
+            except (httpx.HTTPError, A2AClientHTTPError, A2AClientTimeoutError) as e:
+                if not _can_fail_over(e):
+                    raise
+                last_error = e
+                self.replicas.record_failure(replica)
+                if len(tried) >= len(self.replicas.replicas):
+                    raise
+                continue
+            finally:
+                replica.outstanding -= 1
+            self.replicas.record_success(replica, time.perf_counter() - started)
+            return response
+
+    async def send_message_streaming(self, message_request: SendStreamingMessageRequest) -> AsyncIterator[SendStreamingMessageResponse]:
+        # Same as send_message, but a stream that already produced events is never retried
+        tried: set[str] = set()
+        last_error: Exception | None = None
+        while True:
+            replica = self.replicas.select(exclude=tried)
+            if replica is None:
+                # The replicas changed during a discovery refresh and none is left to try
+                raise last_error or RuntimeError(f'No replica available for agent {self.card.name}')
+            tried.add(replica.url)
+            replica.outstanding += 1
+            started = time.perf_counter()
+            first_event = False
+            try:
+                async for response in self._agent_client(replica).send_message_streaming(message_request):
+                    if not first_event:
+                        first_event = True
+                        self.replicas.record_success(replica, time.perf_counter() - started)
+                    yield response
+                return
+            except (httpx.HTTPError, A2AClientHTTPError, A2AClientTimeoutError) as e:
+                if first_event or not _can_fail_over(e):
+                    raise
+                last_error = e
+                self.replicas.record_failure(replica)
+                if len(tried) >= len(self.replicas.replicas):
+                    raise
+            finally:
+                replica.outstanding -= 1
 
 class RoutingAgent:
 
@@ -51,18 +148,37 @@ class RoutingAgent:
         self.remote_agent_connections: dict[str, RemoteAgentConnections] = {}
         self.cards: dict[str, AgentCard] = {}
         self.agents: str = ''
+        self.remote_agent_addresses: list[str] = []
+
+        # Cards are fetched concurrently, conditionally on their cached ETag, and refreshed in the background
+        self.card_cache = AgentCardCache(os.getenv("AGENT_CARD_CACHE", ".agent_cards.json"))
+        self.card_fetch_timeout = float(os.getenv("AGENT_CARD_TIMEOUT_SECONDS", "3"))
+        self.card_refresh_interval = float(os.getenv("AGENT_CARD_REFRESH_SECONDS", "30"))
+        self.card_retry_interval = float(os.getenv("AGENT_CARD_RETRY_SECONDS", "1"))
+        self.missing_addresses: list[str] = []
+        self._refresh_task: asyncio.Task | None = None
+
+        # Replicas failing /health are skipped until they pass again
+        self.health_check_interval = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+        self._health_task: asyncio.Task | None = None
+
+        # One pooled, keep-alive HTTP client for card resolution and every remote agent call
+        self.http_client, self.http_transport = create_http_client()
         
-        # Initialize Azure AI Agents client
-        self.agents_client = AgentsClient(
-            endpoint=os.environ["PROJECT_ENDPOINT"],
-            credential=DefaultAzureCredential(
-                exclude_environment_credential=True,
-                exclude_managed_identity_credential=True
-            )
-        )
+        # Initialize the async Azure AI Agents client so runs never block the event loop
+        self.agents_client, self.credential = create_agents_client()
 
         self.azure_agent = None
-        self.current_thread = None
+
+        # Upper bound for one remote agent call requested by the model
+        self.tool_call_timeout = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "120"))
+
+        # One thread per conversation, idle or least recently used ones are deleted
+        self.conversations = ConversationThreads(
+            self.agents_client,
+            max_conversations=int(os.getenv("MAX_CONVERSATIONS", "256")),
+            ttl_seconds=float(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))
+        )
 
 
     @classmethod
@@ -70,6 +186,8 @@ class RoutingAgent:
         """Create and asynchronously initialize an instance of the RoutingAgent."""
         instance = cls(task_callback)
         await instance._async_init_components(remote_agent_addresses)
+        instance._refresh_task = asyncio.create_task(instance._refresh_remote_agents_periodically())
+        instance._health_task = asyncio.create_task(instance._check_replica_health_periodically())
         return instance
     
 
@@ -87,26 +205,85 @@ class RoutingAgent:
     async def _async_init_components(self, remote_agent_addresses: list[str]) -> None:
         """Asynchronous part of initialization."""
 
-        # Use a single httpx.AsyncClient for all card resolutions for efficiency
-        async with httpx.AsyncClient(timeout=30) as client:
-            for address in remote_agent_addresses:
-                card_resolver = A2ACardResolver(client, address)
-                try:
-                    card = await card_resolver.get_agent_card()
-
-                    remote_connection = RemoteAgentConnections(agent_card=card, agent_url=address)
-                    self.remote_agent_connections[card.name] = remote_connection
-                    self.cards[card.name] = card
+        self.remote_agent_addresses = list(remote_agent_addresses)
+        await self.refresh_remote_agents()
+        print(f"Found remote agents: {self.list_remote_agents()}")
+
+    async def refresh_remote_agents(self) -> bool:
+        # Re-discover every configured address: add agents that answer, drop those that do not.
+        # Returns True when the set of available agents changed
+
+        # Card resolution uses the same pooled client, its connections are then kept alive for the calls
+        found = await discover_agent_cards(self.http_client, self.remote_agent_addresses, self.card_cache,
+                                           timeout=self.card_fetch_timeout)
+
+        # Addresses serving a card with the same name are replicas of one agent
+        replica_urls: dict[str, list[str]] = {}
+        replica_cards: dict[str, AgentCard] = {}
+        for address, card in found.items():
+            replica_urls.setdefault(card.name, []).append(address)
+            replica_cards.setdefault(card.name, card)
+
+        connections: dict[str, RemoteAgentConnections] = {}
+        for name, urls in replica_urls.items():
+            card = replica_cards[name]
+            existing = self.remote_agent_connections.get(name)
+            if existing and existing.card.version == card.version:
+                existing.update_replicas(urls)
+                connections[name] = existing
+            else:
+                connections[name] = RemoteAgentConnections(agent_card=card, agent_urls=urls, httpx_client=self.http_client)
+
+        added = connections.keys() - self.remote_agent_connections.keys()
+        dropped = self.remote_agent_connections.keys() - connections.keys()
+        changed = bool(added or dropped) or any(
+            connections[name] is not self.remote_agent_connections[name] for name in connections.keys() - added
+        )
+        for name in added:
+            print(f"Remote agent available: {name}")
+        for name in dropped:
+            print(f"Remote agent unavailable: {name}")
+
+        self.remote_agent_connections = connections
+        self.cards = {name: connection.card for name, connection in connections.items()}
+        self.missing_addresses = [address for address in self.remote_agent_addresses if address not in found]
+        return changed
+
+    async def _check_replica_health_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            connections = list(self.remote_agent_connections.values())
+            await asyncio.gather(
+                *(connection.replicas.check_health(self.http_client, timeout=self.card_fetch_timeout) for connection in connections),
+                return_exceptions=True
+            )
 
-                except httpx.ConnectError as e:
-                    print( f'ERROR: Failed to get agent card from {address}: {e}')
-                except Exception as e:  # Catch other potential errors
-                    print(f'ERROR: Failed to initialize connection for {address}: {e}')
-            print(f"Found remote agents: {self.list_remote_agents()}")
+    async def _refresh_remote_agents_periodically(self) -> None:
+        retry = self.card_retry_interval
+        while True:
+            # Addresses that did not answer (e.g. servers started at the same time as the router)
+            # are retried sooner, backing off up to the regular refresh interval
+            if self.missing_addresses:
+                delay, retry = retry, min(retry * 2, self.card_refresh_interval)
+            else:
+                delay, retry = self.card_refresh_interval, self.card_retry_interval
+            await asyncio.sleep(delay)
+            try:
+                if await self.refresh_remote_agents() and self.azure_agent:
+                    # The model only routes to agents listed in its instructions
+                    self.azure_agent = await self.agents_client.update_agent(
+                        agent_id=self.azure_agent.id, instructions=self._instructions()
+                    )
+            except Exception as e:
+                print(f"ERROR: Failed to refresh remote agents: {e}")
 
     
     async def send_message(self, agent_name: str, task: str):
         # Sends a task to remote agent.
+        return await self._send_to_agent(agent_name, task)
+
+    async def _send_to_agent(self, agent_name: str, task: str, on_update: AgentUpdateCallback | None = None):
+        # Sends a task to remote agent, over message/stream when the agent supports it
 
         if agent_name not in self.remote_agent_connections:
             raise ValueError(f'Agent {agent_name} not found')
@@ -129,6 +306,9 @@ class RoutingAgent:
             },
         }
         
+
+        if client.card.capabilities.streaming:
+            return await self._stream_from_agent(client, message_id, payload, on_update)
         
         # Wrap the payload in a SendMessageRequest object
         message_request = SendMessageRequest(id=message_id, params=MessageSendParams.model_validate(payload))
@@ -147,108 +327,255 @@ class RoutingAgent:
         return send_response.root.result
 
 
-    def create_agent(self):
+    async def _stream_from_agent(self, client: RemoteAgentConnections, message_id: str, payload: dict[str, Any],
+                                 on_update: AgentUpdateCallback | None) -> TaskStatusUpdateEvent | Task | None:
+        # Forward the remote agent's progress as it arrives and return its last event
+
+        message_request = SendStreamingMessageRequest(id=message_id, params=MessageSendParams.model_validate(payload))
+
+        result = None
+        async for response in client.send_message_streaming(message_request):
+            if not isinstance(response.root, SendStreamingMessageSuccessResponse):
+                print('received non-success streaming response. Aborting get task ')
+                return
+
+            event = response.root.result
+            if on_update and isinstance(event, TaskStatusUpdateEvent) and not event.final and event.status.message:
+                message = event.status.message
+                is_delta = bool(message.metadata and message.metadata.get('delta'))
+                await on_update(client.card.name, get_message_text(message), is_delta)
+            result = event
+
+        # The final status update carries the completed (or failed) state and the full response
+        return result
+
+    async def create_agent(self):
         # Create an Azure AI Agent instance
         
         try:
             # Create Azure AI Agent with the send_message function
             functions = FunctionTool({self.send_message})
-            self.azure_agent = self.agents_client.create_agent(
+            self.azure_agent = await self.agents_client.create_agent(
                 model=os.environ["MODEL_DEPLOYMENT_NAME"],
                 name="routing-agent",
-                instructions=f"""
-                You are an expert Routing Delegator that helps users with requests.
-
-                Your role:
-                - Delegate user inquiries to appropriate specialized remote agents
-                - Provide clear and helpful responses to users
-
-                Available Agents: {self.list_remote_agents()}
-
-                Always be helpful and route requests to the most appropriate agent.""",
+                instructions=self._instructions(),
                 tools=functions.definitions
             )
 
-            # Create a thread for conversation
-            self.current_thread = self.agents_client.threads.create()
-
             return self.azure_agent
             
         except Exception as e:
             print(f"Error creating Azure AI agent: {e}")
             raise
 
-    async def process_user_message(self, user_message: str) -> str:
+    def _instructions(self) -> str:
+        return f"""
+                You are an expert Routing Delegator that helps users with requests.
+
+                Your role:
+                - Delegate user inquiries to appropriate specialized remote agents
+                - Provide clear and helpful responses to users
+
+                Available Agents: {self.list_remote_agents()}
+
+                Always be helpful and route requests to the most appropriate agent."""
+
+    async def process_user_message(self, user_message: str, conversation_id: str | None = None) -> str:
+        # Without a conversation ID the message is a one-off and its thread is deleted afterwards
 
         if not hasattr(self, 'azure_agent') or not self.azure_agent:
             return "Azure AI Agent not initialized. Please ensure the agent is properly created."
         
-        if not hasattr(self, 'current_thread') or not self.current_thread:
-            return "Azure AI Thread not initialized. Please ensure the agent is properly created."
-        
-        try:
-            # Create message in the thread
-            self.agents_client.messages.create(
-                thread_id=self.current_thread.id, 
-                role=MessageRole.User, 
-                content=user_message
-            )
-
-            # Create and run the agent
-            run = self.agents_client.runs.create(
-                thread_id=self.current_thread.id, 
-                agent_id=self.azure_agent.id
-            )
-            
-            # Need to await send_message function
-            while run.status in ["queued", "in_progress", "requires_action"]:
-                time.sleep(1)
-                run = self.agents_client.runs.get(thread_id=self.current_thread.id, run_id=run.id)
-
-                if run.status == "requires_action":
-                    tool_calls = run.required_action.submit_tool_outputs.tool_calls
-                    tool_outputs = []
-                    
-                    for tool_call in tool_calls:
-                        function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
-                        
-                        if function_name == "send_message":
-                            try:
-                                result = await self.send_message(agent_name=function_args["agent_name"], task=function_args["task"])
-                                output = json.dumps(result.model_dump() if hasattr(result, 'model_dump') else str(result))
-
-                            except Exception as e:
-                                output = json.dumps({"error": str(e)})
-                        else:
-                            output = json.dumps({"error": f"Unknown function: {function_name}"})
-                        
-                        tool_outputs.append({"tool_call_id": tool_call.id,  "output": output})
-                
-                    # Submit the tool outputs
-                    self.agents_client.runs.submit_tool_outputs(
-                        thread_id=self.current_thread.id, run_id=run.id, tool_outputs=tool_outputs
-                    )
+        one_off = conversation_id is None
+        if one_off:
+            conversation_id = str(uuid.uuid4())
 
-            if run.status == "failed":
-                error_info = f"Run error: {run.last_error}"
-                print(error_info)
-                return f"Error processing request: {error_info}"
-
-            # Return the response
-            messages = self.agents_client.messages.list(thread_id=self.current_thread.id, order=ListSortOrder.DESCENDING)
-            for msg in messages:
-                if msg.role == MessageRole.AGENT and msg.text_messages:
-                    last_text = msg.text_messages[-1]
-                    return last_text.text.value
-            
-            return "No response received from agent."
+        try:
+            async with self.conversations.lease(conversation_id) as thread_id:
+                return await self._run_on_thread(thread_id, user_message)
             
         except Exception as e:
             error_msg = f"Error in process_user_message: {e}"
             print(error_msg)
             return f"An error occurred while processing your message."
 
+        finally:
+            if one_off:
+                await self.conversations.end(conversation_id)
+
+    async def _run_on_thread(self, thread_id: str, user_message: str,
+                             initial_delay: float = 0.25, max_delay: float = 2.0) -> str:
+        # Add the user message to a thread, run the agent on it and return the reply
+
+        # Create message in the thread
+        await self.agents_client.messages.create(
+            thread_id=thread_id, 
+            role=MessageRole.User, 
+            content=user_message
+        )
+
+        # Create and run the agent
+        run = await self.agents_client.runs.create(
+            thread_id=thread_id, 
+            agent_id=self.azure_agent.id
+        )
+        
+        # Poll with exponential backoff and full jitter, yielding to other requests while waiting
+        delay = initial_delay
+        while run.status in ["queued", "in_progress", "requires_action"]:
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, max_delay)
+            run = await self.agents_client.runs.get(thread_id=thread_id, run_id=run.id)
+
+            if run.status == "requires_action":
+                tool_calls = run.required_action.submit_tool_outputs.tool_calls
+
+                # Dispatch every tool call of this step at once, a failed or timed out call
+                # only turns its own output into an error
+                tool_outputs = await asyncio.gather(*(self._dispatch_tool_call(tool_call) for tool_call in tool_calls))
+            
+                # Submit the tool outputs, the run resumes right away so poll quickly again
+                run = await self.agents_client.runs.submit_tool_outputs(
+                    thread_id=thread_id, run_id=run.id, tool_outputs=tool_outputs
+                )
+                delay = initial_delay
+
+        if run.status == "failed":
+            error_info = f"Run error: {run.last_error}"
+            print(error_info)
+            return f"Error processing request: {error_info}"
+
+        # Return the response
+        messages = self.agents_client.messages.list(thread_id=thread_id, order=ListSortOrder.DESCENDING)
+        async for msg in messages:
+            if msg.role == MessageRole.AGENT and msg.text_messages:
+                last_text = msg.text_messages[-1]
+                return last_text.text.value
+        
+        return "No response received from agent."
+
+    async def _dispatch_tool_call(self, tool_call, on_update: AgentUpdateCallback | None = None) -> dict:
+        # Run one tool call and return its output, never raising
+
+        function_name = tool_call.function.name
+        try:
+            function_args = json.loads(tool_call.function.arguments)
+
+            if function_name == "send_message":
+                result = await asyncio.wait_for(
+                    self._send_to_agent(function_args["agent_name"], function_args["task"], on_update),
+                    timeout=self.tool_call_timeout
+                )
+                output = json.dumps(result.model_dump() if hasattr(result, 'model_dump') else str(result))
+            else:
+                output = json.dumps({"error": f"Unknown function: {function_name}"})
+
+        except asyncio.TimeoutError:
+            output = json.dumps({"error": f"{function_name} timed out after {self.tool_call_timeout} seconds"})
+        except Exception as e:
+            output = json.dumps({"error": str(e)})
+
+        return {"tool_call_id": tool_call.id, "output": output}
+
+    async def stream_user_message(self, user_message: str, conversation_id: str | None = None) -> AsyncIterator[dict]:
+        # Yield {"event", "data"} dicts: remote agent progress, deltas of the reply, then "done" or "error"
+
+        if not hasattr(self, 'azure_agent') or not self.azure_agent:
+            yield {"event": "error", "data": {"error": "Azure AI Agent not initialized."}}
+            return
+
+        queue: asyncio.Queue[dict | None] = asyncio.Queue()
+
+        async def emit(event: str, data: dict) -> None:
+            await queue.put({"event": event, "data": data})
+
+        async def produce() -> None:
+            one_off = conversation_id is None
+            conversation = conversation_id or str(uuid.uuid4())
+            try:
+                async with self.conversations.lease(conversation) as thread_id:
+                    response = await self._stream_on_thread(thread_id, user_message, emit)
+                await emit("done", {"response": response, "conversation_id": conversation_id})
+            except Exception as e:
+                print(f"Error in stream_user_message: {e}")
+                await emit("error", {"error": "An error occurred while processing your message."})
+            finally:
+                if one_off:
+                    await self.conversations.end(conversation)
+                await queue.put(None)
+
+        # Tool calls run concurrently, so events are funneled through a queue
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+        finally:
+            # The client went away before the end of the run
+            if not producer.done():
+                producer.cancel()
+
+    async def _stream_on_thread(self, thread_id: str, user_message: str, emit: StreamEmitCallback) -> str:
+        # Same as _run_on_thread, consuming the run's event stream instead of polling
+
+        await self.agents_client.messages.create(thread_id=thread_id, role=MessageRole.User, content=user_message)
+
+        async def on_update(agent_name: str, text: str, is_delta: bool) -> None:
+            await emit("agent_delta" if is_delta else "agent_status", {"agent": agent_name, "text": text})
+
+        chunks = []
+        run = None
+        async with await self.agents_client.runs.stream(thread_id=thread_id, agent_id=self.azure_agent.id) as stream:
+            async for event_type, event_data, _ in stream:
+                if isinstance(event_data, MessageDeltaChunk):
+                    chunks.append(event_data.text)
+                    await emit("delta", {"text": event_data.text})
+
+                elif isinstance(event_data, ThreadRun):
+                    run = event_data
+                    if run.status == "requires_action" and isinstance(run.required_action, SubmitToolOutputsAction):
+                        tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                        tool_outputs = await asyncio.gather(*(self._dispatch_tool_call(tool_call, on_update) for tool_call in tool_calls))
+
+                        # Re-initializes the stream with the events of the resumed run
+                        await self.agents_client.runs.submit_tool_outputs_stream(
+                            thread_id=thread_id, run_id=run.id, tool_outputs=tool_outputs, event_handler=stream
+                        )
+
+                elif event_type == AgentStreamEvent.ERROR:
+                    raise RuntimeError(f"Run stream error: {event_data}")
+
+                elif event_type == AgentStreamEvent.DONE:
+                    break
+
+        if run is not None and run.status == "failed":
+            error_info = f"Run error: {run.last_error}"
+            print(error_info)
+            return f"Error processing request: {error_info}"
+
+        return "".join(chunks) or "No response received from agent."
+
+    def connection_metrics(self) -> dict[str, list[dict]]:
+        # Per replica of every remote agent: balancing state, requests in flight, idle kept-alive
+        # connections and connection wait time
+        return {
+            name: [
+                {**replica.as_dict(), **self.http_transport.stats(MeteredTransport.origin(replica.url))}
+                for replica in connection.replicas.replicas
+            ]
+            for name, connection in self.remote_agent_connections.items()
+        }
+
+    async def close(self) -> None:
+        # Stop discovery, delete the conversation threads and release the async client sessions
+        for task in (self._refresh_task, self._health_task):
+            if task:
+                task.cancel()
+        await self.conversations.close()
+        await self.http_client.aclose()
+        await self.agents_client.close()
+        if self.credential:
+            await self.credential.close()
+
 
 async def _get_initialized_routing_agent_sync() -> RoutingAgent:
 
@@ -260,7 +587,7 @@ async def _get_initialized_routing_agent_sync() -> RoutingAgent:
             ]
         )
         # Create the Azure AI agent
-        routing_agent_instance.create_agent()
+        await routing_agent_instance.create_agent()
         return routing_agent_instance
 
     try:
@@ -0,0 +1,108 @@
+""" Maps conversation IDs to Azure AI Foundry threads with LRU and TTL eviction """
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from azure.ai.agents.aio import AgentsClient
+
+
+class _ConversationThread:
+
+    def __init__(self):
+        # Created by the first request holding the lock, outside the map's lock
+        self.thread_id: str | None = None
+        self.last_used = time.monotonic()
+        # A thread accepts one active run at a time
+        self.lock = asyncio.Lock()
+        # Requests running or waiting on this thread, which is never evicted while in use
+        self.users = 0
+
+
+class ConversationThreads:
+    """One Foundry thread per conversation, so each run only reads its own history.
+
+    Threads idle for longer than `ttl_seconds`, and the least recently used
+    threads beyond `max_conversations`, are evicted and deleted on the service.
+    """
+
+    def __init__(self, agents_client: AgentsClient, max_conversations: int = 256, ttl_seconds: float = 1800):
+        self.agents_client = agents_client
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+
+        self._threads: OrderedDict[str, _ConversationThread] = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._deletions: set[asyncio.Task] = set()
+
+    @asynccontextmanager
+    async def lease(self, conversation_id: str) -> AsyncIterator[str]:
+        # Yield the thread ID of a conversation, holding it exclusively for one run
+
+        async with self._lock:
+            entry = self._threads.get(conversation_id)
+            if entry is None:
+                entry = _ConversationThread()
+                self._threads[conversation_id] = entry
+            self._threads.move_to_end(conversation_id)
+            entry.users += 1
+            self._evict()
+
+        try:
+            async with entry.lock:
+                if entry.thread_id is None:
+                    entry.thread_id = (await self.agents_client.threads.create()).id
+                yield entry.thread_id
+        finally:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    async def end(self, conversation_id: str) -> None:
+        # Forget a conversation and delete its thread once no request uses it
+
+        async with self._lock:
+            entry = self._threads.get(conversation_id)
+            if entry and entry.users == 0:
+                del self._threads[conversation_id]
+                self._delete(entry.thread_id)
+
+    def _evict(self) -> None:
+        # Called with self._lock held
+        now = time.monotonic()
+        for conversation_id, entry in list(self._threads.items()):
+            if entry.users:
+                continue
+            expired = now - entry.last_used > self.ttl_seconds
+            if expired or len(self._threads) > self.max_conversations:
+                del self._threads[conversation_id]
+                self.evictions += 1
+                self._delete(entry.thread_id)
+
+    def _delete(self, thread_id: str | None) -> None:
+        # Delete in the background so the request that triggered eviction does not wait
+        if thread_id is None:
+            return
+        task = asyncio.create_task(self._delete_thread(thread_id))
+        self._deletions.add(task)
+        task.add_done_callback(self._deletions.discard)
+
+    async def _delete_thread(self, thread_id: str) -> None:
+        try:
+            await self.agents_client.threads.delete(thread_id)
+        except Exception as e:
+            print(f"WARNING: Failed to delete thread {thread_id}: {e}")
+
+    def stats(self) -> dict:
+        return {"conversations": len(self._threads), "evictions": self.evictions}
+
+    async def close(self) -> None:
+        # Delete every remaining thread
+        async with self._lock:
+            for entry in self._threads.values():
+                self._delete(entry.thread_id)
+            self._threads.clear()
+        if self._deletions:
+            await asyncio.gather(*self._deletions, return_exceptions=True)
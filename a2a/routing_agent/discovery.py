@@ -0,0 +1,79 @@
+""" Agent card discovery for the routing agent, with an on-disk cache and conditional requests """
+
+import asyncio
+import json
+import os
+
+import httpx
+from a2a.client import A2ACardResolver
+from a2a.types import AgentCard
+
+
+class AgentCardCache:
+    """Last card and ETag seen for every agent address, persisted as JSON.
+
+    The ETag is sent back as If-None-Match so an unchanged card costs a 304 with
+    no body, including across router restarts.
+    """
+
+    def __init__(self, path: str = '.agent_cards.json'):
+        self.path = path
+        self._entries: dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f'WARNING: Ignoring unreadable agent card cache {path}: {e}')
+
+    def get(self, address: str) -> dict | None:
+        return self._entries.get(address)
+
+    def put(self, address: str, entry: dict) -> None:
+        self._entries[address] = entry
+
+    def save(self) -> None:
+        # Write then rename, so a crash never leaves a truncated cache
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(temporary, self.path)
+
+
+async def fetch_agent_card(client: httpx.AsyncClient, address: str, cache: AgentCardCache,
+                           timeout: float) -> AgentCard | None:
+    # Fetch one card, or return None if the agent cannot be reached within `timeout`
+
+    resolver = A2ACardResolver(client, address)
+    url = f'{address.rstrip("/")}/{resolver.agent_card_path}'
+    cached = cache.get(address)
+    headers = {'If-None-Match': cached['etag']} if cached and cached.get('etag') else {}
+
+    try:
+        response = await client.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            return AgentCard.model_validate(cached['card'])
+        response.raise_for_status()
+        data = response.json()
+        card = AgentCard.model_validate(data)
+    except httpx.HTTPError as e:
+        print(f'ERROR: Failed to get agent card from {address}: {e!r}')
+        return None
+    except Exception as e:  # Catch other potential errors
+        print(f'ERROR: Invalid agent card from {address}: {e}')
+        return None
+
+    cache.put(address, {'etag': response.headers.get('etag'), 'card': data})
+    return card
+
+
+async def discover_agent_cards(client: httpx.AsyncClient, addresses: list[str], cache: AgentCardCache,
+                               timeout: float = 3.0) -> dict[str, AgentCard]:
+    # Fetch every card concurrently, so one slow or down agent costs at most `timeout`
+
+    cards = await asyncio.gather(*(fetch_agent_card(client, address, cache, timeout) for address in addresses))
+    try:
+        cache.save()
+    except OSError as e:
+        print(f'WARNING: Failed to save agent card cache {cache.path}: {e}')
+    return {address: card for address, card in zip(addresses, cards) if card is not None}
@@ -0,0 +1,145 @@
+""" Shared HTTP client for the routing agent's remote agent calls, with per-origin connection metrics """
+
+import os
+import time
+from collections.abc import AsyncIterator, Callable
+
+import httpcore
+import httpx
+
+
+class OriginMetrics:
+
+    def __init__(self):
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'active': self.active,
+            'peak_active': self.peak_active,
+            'avg_wait_ms': round(1000 * self.total_wait / self.requests, 3) if self.requests else 0.0,
+            'max_wait_ms': round(1000 * self.max_wait, 3),
+        }
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    # A request stays active until its response body is closed, which matters for streamed responses
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records, per origin, requests in flight and the time spent waiting for a connection.
+
+    The wait lasts from the start of the request until the pool hands out a
+    connection: either a new connection starts connecting or a kept-alive one
+    starts sending the request. It is measured with httpcore trace events.
+    """
+
+    def __init__(self, **transport_options):
+        self._transport = httpx.AsyncHTTPTransport(**transport_options)
+        self.metrics: dict[str, OriginMetrics] = {}
+
+    @staticmethod
+    def origin(url: httpx.URL | str) -> str:
+        url = httpx.URL(url)
+        return f'{url.scheme}://{url.host}:{url.port or (443 if url.scheme == "https" else 80)}'
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        metrics = self.metrics.setdefault(self.origin(request.url), OriginMetrics())
+        metrics.requests += 1
+        metrics.active += 1
+        metrics.peak_active = max(metrics.peak_active, metrics.active)
+
+        started = time.perf_counter()
+        acquired = False
+        previous_trace = request.extensions.get('trace')
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired and event_name.endswith(('connect_tcp.started', 'send_request_headers.started')):
+                acquired = True
+                wait = time.perf_counter() - started
+                metrics.total_wait += wait
+                metrics.max_wait = max(metrics.max_wait, wait)
+            if previous_trace:
+                await previous_trace(event_name, info)
+
+        request.extensions = {**request.extensions, 'trace': trace}
+
+        def release() -> None:
+            metrics.active -= 1
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _MeteredStream(response.stream, release)
+        return response
+
+    def idle_connections(self, origin: str) -> int | None:
+        # Kept-alive connections to `origin` currently in the pool and not serving a request.
+        # This reads httpcore's pool, which is not public API: None if its layout changed
+        connections = getattr(getattr(self._transport, '_pool', None), 'connections', None)
+        if connections is None:
+            return None
+        url = httpx.URL(origin)
+        try:
+            target = httpcore.Origin(url.raw_scheme, url.raw_host, url.port or (443 if url.scheme == 'https' else 80))
+            return sum(1 for connection in list(connections)
+                       if connection.can_handle_request(target) and connection.is_idle())
+        except (AttributeError, TypeError):
+            return None
+
+    def stats(self, origin: str) -> dict:
+        stats = self.metrics.get(origin, OriginMetrics()).as_dict()
+        stats['idle'] = self.idle_connections(origin)
+        return stats
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_http_client() -> tuple[httpx.AsyncClient, MeteredTransport]:
+    # One client, and one connection pool, for every remote agent
+
+    transport = MeteredTransport(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv('REMOTE_AGENT_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=int(os.getenv('REMOTE_AGENT_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=float(os.getenv('REMOTE_AGENT_KEEPALIVE_EXPIRY', '30')),
+        ),
+        # Needs the h2 package, and only applies to https:// agents (negotiated with ALPN)
+        http2=os.getenv('REMOTE_AGENT_HTTP2', 'false').lower() == 'true',
+    )
+    client = httpx.AsyncClient(
+        transport=transport,
+        # Fail fast on unreachable agents, but let a model run take its time
+        timeout=httpx.Timeout(
+            connect=float(os.getenv('REMOTE_AGENT_CONNECT_TIMEOUT', '5')),
+            read=float(os.getenv('REMOTE_AGENT_READ_TIMEOUT', '120')),
+            write=10.0,
+            pool=float(os.getenv('REMOTE_AGENT_POOL_TIMEOUT', '10')),
+        ),
+    )
+    return client, transport
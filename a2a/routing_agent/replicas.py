@@ -0,0 +1,110 @@
+""" Replica selection, passive ejection and active health checks for remote agents served by several addresses """
+
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+
+class Replica:
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_latency: float | None = None
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def as_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'ewma_latency_ms': round(1000 * self.ewma_latency, 1) if self.ewma_latency is not None else None,
+            'healthy': self.healthy,
+            'ejected': time.monotonic() < self.ejected_until,
+        }
+
+
+class ReplicaSet:
+    """The addresses serving one agent.
+
+    `select` prefers available replicas: healthy according to the last /health
+    check and not ejected after a failed call. Among them, the policy is either
+    `least_outstanding` (fewest requests in flight, then lowest latency) or
+    `ewma` (lowest latency EWMA weighted by requests in flight). A failed call
+    ejects its replica for an exponentially growing time, which only a
+    successful call ends early.
+    """
+
+    def __init__(self, urls: list[str], policy: str = 'least_outstanding', ewma_alpha: float = 0.3,
+                 base_ejection: float = 5.0, max_ejection: float = 120.0):
+        if policy not in ('least_outstanding', 'ewma'):
+            raise ValueError(f"Unknown balancing policy '{policy}', expected 'least_outstanding' or 'ewma'")
+        self.policy = policy
+        self.ewma_alpha = ewma_alpha
+        self.base_ejection = base_ejection
+        self.max_ejection = max_ejection
+        self.replicas: list[Replica] = [Replica(url) for url in urls]
+
+    def update(self, urls: list[str]) -> None:
+        # Keep the state of replicas that are still configured
+        existing = {replica.url: replica for replica in self.replicas}
+        self.replicas = [existing.get(url) or Replica(url) for url in urls]
+
+    def select(self, exclude: set[str] = frozenset()) -> Replica | None:
+        candidates = [replica for replica in self.replicas if replica.url not in exclude]
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        # When every replica looks down, trying one beats failing outright
+        available = [replica for replica in candidates if replica.available(now)] or candidates
+
+        # Replicas without a measurement yet rank as the fastest, so they get traffic
+        if self.policy == 'ewma':
+            key = lambda replica: ((replica.ewma_latency or 0.0) * (replica.outstanding + 1), replica.outstanding)
+        else:
+            key = lambda replica: (replica.outstanding, replica.ewma_latency or 0.0)
+        best = min(key(replica) for replica in available)
+        return random.choice([replica for replica in available if key(replica) == best])
+
+    def record_success(self, replica: Replica, latency: float) -> None:
+        replica.failures = 0
+        replica.ejected_until = 0.0
+        if replica.ewma_latency is None:
+            replica.ewma_latency = latency
+        else:
+            replica.ewma_latency += self.ewma_alpha * (latency - replica.ewma_latency)
+
+    def record_failure(self, replica: Replica) -> None:
+        replica.failures += 1
+        ejection = min(self.base_ejection * 2 ** (replica.failures - 1), self.max_ejection)
+        replica.ejected_until = time.monotonic() + ejection
+        print(f'WARNING: Ejecting replica {replica.url} for {ejection:.0f}s after {replica.failures} failure(s)')
+
+    async def check_health(self, client: httpx.AsyncClient, timeout: float) -> None:
+        # Probe every replica's /health endpoint concurrently
+
+        async def probe(replica: Replica) -> None:
+            try:
+                response = await client.get(f'{replica.url.rstrip("/")}/health', timeout=timeout)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != replica.healthy:
+                print(f'Replica {replica.url} is {"healthy" if healthy else "unhealthy"}')
+            # /health only shows the process is up, so a passive ejection still runs until it
+            # expires or a call to the replica succeeds
+            replica.healthy = healthy
+
+        await asyncio.gather(*(probe(replica) for replica in self.replicas))
+
+
+def balancing_policy() -> str:
+    return os.getenv('REMOTE_AGENT_BALANCING', 'least_outstanding')
@@ -1,25 +1,42 @@
 import os
+import json
 import asyncio
 from fastapi import FastAPI, Request
+from sse_starlette.sse import EventSourceResponse
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
+from response_cache import normalize_prompt
 from routing_agent.agent import RoutingAgent  
+from routing_agent.single_flight import SingleFlight
 
 load_dotenv()
 
 routing_agent = None
 
+# Opt-in: identical messages of the same conversation arriving while one is processed share its response.
+# Messages without a conversation_id all share one scope, so identical one-off messages from different
+# users get one shared answer (and load tests sending the same prompts measure far fewer real runs).
+coalesce_requests = os.getenv("REQUEST_COALESCING", "false").lower() == "true"
+in_flight_messages = SingleFlight()
+
+def agent_addresses(name: str) -> list[str]:
+    # <NAME>_ADDRESSES lists the replicas of an agent (comma separated), otherwise SERVER_URL and <NAME>_PORT are used
+    addresses = os.getenv(f"{name}_ADDRESSES")
+    if addresses:
+        return [address.strip() for address in addresses.split(",") if address.strip()]
+    return [f"http://{os.environ['SERVER_URL']}:{os.environ[f'{name}_PORT']}"]
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global routing_agent
     print("Starting up: Initializing routing agent...")
-    routing_agent = await RoutingAgent.create([
-        f"http://{os.environ["SERVER_URL"]}:{os.environ["TITLE_AGENT_PORT"]}",
-        f"http://{os.environ["SERVER_URL"]}:{os.environ["OUTLINE_AGENT_PORT"]}",
-    ])
-    routing_agent.create_agent()
+    routing_agent = await RoutingAgent.create(
+        agent_addresses("TITLE_AGENT") + agent_addresses("OUTLINE_AGENT")
+    )
+    await routing_agent.create_agent()
     print("Routing agent initialized.")
     yield
+    await routing_agent.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -29,17 +46,50 @@ async def handle_message(request: Request):
 
     data = await request.json()
     user_message = data.get("message")
+    # Messages sharing a conversation_id continue the same thread, without one the message stands alone
+    conversation_id = data.get("conversation_id")
 
     if not user_message:
         return {"error": "No message provided."}
     
     try:
-        response = await routing_agent.process_user_message(user_message)
+        if coalesce_requests:
+            response = await in_flight_messages.do(
+                (conversation_id, normalize_prompt(user_message)),
+                lambda: routing_agent.process_user_message(user_message, conversation_id)
+            )
+        else:
+            response = await routing_agent.process_user_message(user_message, conversation_id)
 
     except Exception as e:
         return {"error": f"Failed to process message: {str(e)}"}
     
-    return {"response": response}
+    return {"response": response, "conversation_id": conversation_id}
+
+@app.post("/message/stream")
+async def handle_message_stream(request: Request):
+    # Same as /message, as Server-Sent Events: agent_status, agent_delta and delta events, then done or error
+
+    data = await request.json()
+    user_message = data.get("message")
+    conversation_id = data.get("conversation_id")
+
+    if not user_message:
+        return {"error": "No message provided."}
+
+    async def events():
+        async for item in routing_agent.stream_user_message(user_message, conversation_id):
+            yield {"event": item["event"], "data": json.dumps(item["data"])}
+
+    return EventSourceResponse(events())
+
+@app.get("/metrics/connections")
+async def connection_metrics():
+    return routing_agent.connection_metrics()
+
+@app.get("/metrics/coalescing")
+async def coalescing_metrics():
+    return {"enabled": coalesce_requests, **in_flight_messages.stats()}
 
 @app.get("/health")
 async def health_check():
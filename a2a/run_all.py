@@ -7,7 +7,6 @@ import time
 import signal
 import httpx
 import os
-import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,104 +16,178 @@ servers = [
     {
         "name": "title_agent_server",
         "module": "title_agent.server:app",
-        "port": os.environ["TITLE_AGENT_PORT"]
+        "port": os.environ["TITLE_AGENT_PORT"],
+        "workers": int(os.getenv("TITLE_AGENT_WORKERS", "1"))
     },
     {
         "name": "outline_agent_server",
         "module": "outline_agent.server:app",
-        "port": os.environ["OUTLINE_AGENT_PORT"]
+        "port": os.environ["OUTLINE_AGENT_PORT"],
+        "workers": int(os.getenv("OUTLINE_AGENT_WORKERS", "1"))
     },
     {
         "name": "routing_agent_server",
         "module": "routing_agent.server:app",
-        "port": os.environ["ROUTING_AGENT_PORT"]
+        "port": os.environ["ROUTING_AGENT_PORT"],
+        "workers": int(os.getenv("ROUTING_AGENT_WORKERS", "1"))
     },
 ]
 
-server_procs = []
+def check_workers():
+    # Some state lives in process memory, so a follow-up request must reach the worker that served the first one:
+    # - routing agent: the conversation to thread map and the in-flight request table
+    # - title and outline agents: their tasks, unless TASK_STORE=sqlite shares them between workers
+    #   (their response caches stay per worker, which only lowers the hit rate)
+    errors = []
+    for server in servers:
+        if server["workers"] <= 1:
+            continue
+        if server["name"] == "routing_agent_server":
+            errors.append("ROUTING_AGENT_WORKERS must be 1, run more routing agents behind sticky sessions instead")
+        elif os.getenv("TASK_STORE", "memory").lower() != "sqlite":
+            env_name = server["name"].removesuffix("_server").upper() + "_WORKERS"
+            errors.append(f"{env_name} > 1 requires TASK_STORE=sqlite, otherwise tasks/get may reach a worker that never saw the task")
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+
+# A server that stays up this long is considered stable again, resetting its restart backoff
+STABLE_AFTER_SECONDS = 60
+MAX_RESTART_BACKOFF_SECONDS = 30
+
+server_procs: dict[str, asyncio.subprocess.Process] = {}
+stopping = asyncio.Event()
 
-async def wait_for_server_ready(server, timeout=30):
+async def wait_for_server_ready(server, process, timeout=60):
     async with httpx.AsyncClient() as client:
         start = time.time()
+        health_url = f"http://{server_url}:{server['port']}/health"
         while True:
+            if process.returncode is not None:
+                return False
             try:
-                health_url = f"http://{server_url}:{server['port']}/health"
                 r = await client.get(health_url, timeout=2)
                 if r.status_code == 200:
-                    print(f"✅ {server['name']} is healthy and ready!")
                     return True
             except Exception:
                 pass
             if time.time() - start > timeout:
                 print(f"❌ Timeout waiting for server health at {health_url}")
                 return False
-            await asyncio.sleep(1)
+            await asyncio.sleep(0.25)
 
-def stream_subprocess_output(process):
+async def print_logs(log_queue: asyncio.Queue):
+    # Single reader for the output of every server, one tagged line at a time
     while True:
-        line = process.stdout.readline()
-        if not line:
+        name, line = await log_queue.get()
+        print(f"[{name}] {line}")
+
+async def forward_output(name: str, process: asyncio.subprocess.Process, log_queue: asyncio.Queue):
+    async for line in process.stdout:
+        await log_queue.put((name, line.decode(errors="replace").rstrip()))
+
+async def start_server(server) -> asyncio.subprocess.Process:
+    cmd = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        server["module"],
+        "--host",
+        server_url,
+        "--port",
+        str(server["port"]),
+        "--workers",
+        str(server["workers"]),
+        "--log-level",
+        "info"
+    ]
+    # On Windows, a new process group lets stop_server send CTRL_BREAK_EVENT to the server only
+    creationflags = subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0
+    return await asyncio.create_subprocess_exec(
+        *cmd,
+        env=os.environ.copy(),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        creationflags=creationflags,
+    )
+
+async def supervise_server(server, ready: asyncio.Event, log_queue: asyncio.Queue):
+    # Start a server, report when it is healthy and restart it with backoff whenever it exits
+    backoff = 1
+    while not stopping.is_set():
+        print(f"🚀 Starting {server['name']} on port {server['port']} with {server['workers']} worker(s)")
+        started = time.perf_counter()
+        process = await start_server(server)
+        server_procs[server["name"]] = process
+        output = asyncio.create_task(forward_output(server["name"], process, log_queue))
+
+        if await wait_for_server_ready(server, process):
+            print(f"✅ {server['name']} is healthy and ready in {time.perf_counter() - started:.1f}s")
+            ready.set()
+
+        returncode = await process.wait()
+        await output
+        if stopping.is_set():
             break
-        print(line.rstrip())
 
+        if time.perf_counter() - started > STABLE_AFTER_SECONDS:
+            backoff = 1
+        print(f"💥 {server['name']} exited with code {returncode}, restarting in {backoff}s")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, MAX_RESTART_BACKOFF_SECONDS)
+
+async def stop_server(process: asyncio.subprocess.Process):
+    if process.returncode is None:  # Still running
+        if sys.platform == "win32":
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            process.kill()
 
 async def run_client_main():
     from client import main as client_main
-    await client_main()
+    # The interactive client blocks on input(), keep it off the loop that reads the server logs
+    await asyncio.to_thread(asyncio.run, client_main())
 
 async def main():
+    check_workers()
     print("🚀 Starting server subprocesses...")
-    for server in servers:
-        cmd = [
-            sys.executable,
-            "-m",
-            "uvicorn",
-            server["module"],
-            "--host",
-            server_url,
-            "--port",
-            str(server["port"]),
-            "--log-level",
-            "info"
-        ]
-        
-        print(f"🚀 Starting {server['name']} on port {server['port']}")
-        process = subprocess.Popen(
-            cmd,
-            env=os.environ.copy(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            universal_newlines=True,
-        )
-        server_procs.append(process)
-
-        thread = threading.Thread(target=stream_subprocess_output, args=(process,), daemon=True)
-        thread.start()
-
-        ready = await wait_for_server_ready(server)
-        if not ready:
-            print(f"❌ Server '{server['name']}' failed to start, killing process...")
-            process.kill()
-            sys.exit(1)
+    log_queue: asyncio.Queue = asyncio.Queue()
+    logger = asyncio.create_task(print_logs(log_queue))
+
+    # All servers start at once; the routing agent picks up the others as soon as they answer
+    started = time.perf_counter()
+    ready = {server["name"]: asyncio.Event() for server in servers}
+    supervisors = [
+        asyncio.create_task(supervise_server(server, ready[server["name"]], log_queue))
+        for server in servers
+    ]
 
     try:
-        await run_client_main()
-    except Exception as e:
-        print(f"❌ Client stopped: {e}")
+        startup_timeout = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "120"))
+        try:
+            await asyncio.wait_for(asyncio.gather(*(event.wait() for event in ready.values())), timeout=startup_timeout)
+        except asyncio.TimeoutError:
+            not_ready = [name for name, event in ready.items() if not event.is_set()]
+            print(f"❌ Servers failed to start within {startup_timeout:.0f}s: {', '.join(not_ready)}")
+            sys.exit(1)
+        print(f"✅ All servers ready in {time.perf_counter() - started:.1f}s")
+
+        try:
+            await run_client_main()
+        except Exception as e:
+            print(f"❌ Client stopped: {e}")
     finally:
-        print("🛑 Stopping server subprocess...")
-        # Terminate the server subprocess gracefully
-        for process in server_procs:
-            if process.poll() is None:  # Still running
-                if sys.platform == "win32":
-                    process.send_signal(signal.CTRL_BREAK_EVENT)
-                else:
-                    process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
+        print("🛑 Stopping server subprocesses...")
+        # Terminate the server subprocesses gracefully
+        stopping.set()
+        await asyncio.gather(*(stop_server(process) for process in server_procs.values()))
+        for task in supervisors + [logger]:
+            task.cancel()
 
 if __name__ == "__main__":
     asyncio.run(main())
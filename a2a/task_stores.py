@@ -0,0 +1,215 @@
+""" Task stores for the A2A servers, selected with the TASK_STORE environment variable
+
+TASK_STORE=memory (default) keeps tasks in memory, evicting them by age and count.
+TASK_STORE=sqlite persists them in a SQLite file in WAL mode (TASK_STORE_PATH).
+
+Benchmark the task writes per second under concurrency:
+    python task_stores.py --store sqlite --tasks 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from a2a.server.context import ServerCallContext
+from a2a.server.tasks import TaskStore
+from a2a.types import Task, TaskState, TaskStatus
+from a2a.utils import new_agent_text_message
+
+
+class BoundedInMemoryTaskStore(TaskStore):
+    """In-memory task store that forgets tasks older than `ttl_seconds` or beyond `max_tasks`.
+
+    InMemoryTaskStore keeps every task for the lifetime of the process.
+    """
+
+    def __init__(self, max_tasks: int = 10000, ttl_seconds: float = 3600):
+        self.max_tasks = max_tasks
+        self.ttl_seconds = ttl_seconds
+        # task_id -> (task, last update), least recently updated first
+        self._tasks: OrderedDict[str, tuple[Task, float]] = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def save(self, task: Task, context: ServerCallContext | None = None) -> None:
+        async with self._lock:
+            self._tasks[task.id] = (task, time.monotonic())
+            self._tasks.move_to_end(task.id)
+            self._evict()
+
+    async def get(self, task_id: str, context: ServerCallContext | None = None) -> Task | None:
+        async with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._tasks[task_id]
+                return None
+            return entry[0]
+
+    async def delete(self, task_id: str, context: ServerCallContext | None = None) -> None:
+        async with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def _evict(self) -> None:
+        # Oldest first, so stop at the first task that is recent enough
+        now = time.monotonic()
+        while self._tasks:
+            task_id, (_, updated) = next(iter(self._tasks.items()))
+            if len(self._tasks) <= self.max_tasks and now - updated <= self.ttl_seconds:
+                break
+            del self._tasks[task_id]
+
+
+class SqliteTaskStore(TaskStore):
+    """Task store persisted in SQLite with write-ahead logging.
+
+    Tasks survive a server restart. Queries run in a worker thread so the event
+    loop is not blocked, and tasks older than `ttl_seconds` are purged periodically.
+    """
+
+    def __init__(self, path: str = 'tasks.sqlite', ttl_seconds: float = 7 * 24 * 3600, purge_every: int = 1000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = purge_every
+        self._writes = 0
+
+        # One connection shared by worker threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            ' id TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' updated REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated)')
+
+    async def save(self, task: Task, context: ServerCallContext | None = None) -> None:
+        await asyncio.to_thread(self._save, task.id, task.model_dump_json())
+
+    async def get(self, task_id: str, context: ServerCallContext | None = None) -> Task | None:
+        value = await asyncio.to_thread(self._get, task_id)
+        return Task.model_validate_json(value) if value else None
+
+    async def delete(self, task_id: str, context: ServerCallContext | None = None) -> None:
+        await asyncio.to_thread(self._execute, 'DELETE FROM tasks WHERE id = ?', (task_id,))
+
+    def _save(self, task_id: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO tasks (id, value, updated) VALUES (?, ?, ?)',
+                (task_id, value, time.time())
+            )
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._conn.execute('DELETE FROM tasks WHERE updated < ?', (time.time() - self.ttl_seconds,))
+
+    def _get(self, task_id: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def _execute(self, sql: str, parameters: tuple) -> None:
+        with self._lock:
+            self._conn.execute(sql, parameters)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_task_store(name: str) -> TaskStore:
+    # `name` identifies the server, it is the default SQLite file name
+    kind = os.getenv('TASK_STORE', 'memory').lower()
+    if kind == 'sqlite':
+        return SqliteTaskStore(
+            path=os.getenv('TASK_STORE_PATH', f'{name}_tasks.sqlite'),
+            ttl_seconds=float(os.getenv('TASK_STORE_TTL_SECONDS', str(7 * 24 * 3600)))
+        )
+    if kind == 'memory':
+        return BoundedInMemoryTaskStore(
+            max_tasks=int(os.getenv('TASK_STORE_MAX_TASKS', '10000')),
+            ttl_seconds=float(os.getenv('TASK_STORE_TTL_SECONDS', '3600'))
+        )
+    raise ValueError(f"Unknown TASK_STORE '{kind}', expected 'memory' or 'sqlite'")
+
+
+async def benchmark(store: TaskStore, tasks: int, concurrency: int, updates_per_task: int) -> dict:
+    # Save tasks the way a request does: submitted, working updates, then completed
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_task() -> None:
+        async with semaphore:
+            task = Task(
+                id=str(uuid.uuid4()),
+                context_id=str(uuid.uuid4()),
+                status=TaskStatus(state=TaskState.submitted),
+                history=[],
+            )
+            for update in range(updates_per_task):
+                if update:
+                    task.status = TaskStatus(
+                        state=TaskState.completed if update == updates_per_task - 1 else TaskState.working,
+                        message=new_agent_text_message(f'Update {update} ' + 'x' * 200, context_id=task.context_id)
+                    )
+                started = time.perf_counter()
+                await store.save(task)
+                latencies.append(time.perf_counter() - started)
+            await store.get(task.id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_task() for _ in range(tasks)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'store': type(store).__name__,
+        'tasks': tasks,
+        'concurrency': concurrency,
+        'writes': len(latencies),
+        'elapsed_seconds': round(elapsed, 3),
+        'writes_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark task writes per second of the A2A task stores')
+    parser.add_argument('--store', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--path', default='benchmark_tasks.sqlite', help='SQLite file (removed afterwards)')
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--updates-per-task', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.store == 'sqlite':
+        store = SqliteTaskStore(args.path)
+    else:
+        store = BoundedInMemoryTaskStore(max_tasks=args.tasks)
+
+    try:
+        result = asyncio.run(benchmark(store, args.tasks, args.concurrency, args.updates_per_task))
+    finally:
+        if isinstance(store, SqliteTaskStore):
+            store.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(args.path + suffix):
+                    os.remove(args.path + suffix)
+
+    for key, value in result.items():
+        print(f'{key}: {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,27 @@
 """ Azure AI Foundry Agent that generates a title """
 
 import os
-from azure.ai.agents import AgentsClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import Agent, ListSortOrder, MessageRole
+from collections.abc import AsyncIterator
+from azure.ai.agents.models import Agent, AgentStreamEvent, MessageDeltaChunk, MessageRole, ThreadRun
+from foundry_client import create_agents_client
+from foundry_thread_pool import FoundryThreadPool
 
 class TitleAgent:
 
     def __init__(self):
 
         # Create the agents client
-        self.client = AgentsClient(
-            endpoint=os.environ['PROJECT_ENDPOINT'],
-            credential=DefaultAzureCredential(
-                exclude_environment_credential=True,
-                exclude_managed_identity_credential=True
-            )
-        )
+        self.client, self.credential = create_agents_client()
 
         self.agent: Agent | None = None
+        self.threads = FoundryThreadPool(self.client, name='title-agent', size=int(os.getenv('THREAD_POOL_SIZE', '4')))
 
     async def create_agent(self) -> Agent:
         if self.agent:
             return self.agent
 
         # Create the title agent
-        self.agent = self.client.create_agent(
+        self.agent = await self.client.create_agent(
             model=os.environ['MODEL_DEPLOYMENT_NAME'],
             name='title-agent',
             instructions="""
@@ -33,38 +29,53 @@ class TitleAgent:
             Given a topic the user wants to write about, suggest a single clear and catchy blog post title.
             """,
         )   
+        await self.threads.start()
         return self.agent
         
     async def run_conversation(self, user_message: str) -> list[str]:
-        # Add a message to the thread, process it, and retrieve the response
+        # Run the conversation and return the complete response
 
-        if not self.agent:
-            await self.create_agent()
+        try:
+            response = ''.join([delta async for delta in self.stream_conversation(user_message)])
+        except RuntimeError as e:
+            print(f'Title Agent: {e}')
+            return [f'Error: {e}']
+
+        return [response] if response else ['No response received']
 
-        # Create a thread for the chat session
-        thread = self.client.threads.create()
+    async def stream_conversation(self, user_message: str) -> AsyncIterator[str]:
+        # Run the agent on a new thread and yield the response text as it is generated
 
-        # Send user message
-        self.client.messages.create(thread_id=thread.id, role=MessageRole.USER, content=user_message)
+        if not self.agent:
+            await self.create_agent()
 
-        # Create and run the agent
-        run = self.client.runs.create_and_process(thread_id=thread.id, agent_id=self.agent.id)
+        # Lease a fresh pre-created thread for the chat session
+        async with self.threads.lease() as thread_id:
 
-        if run.status == 'failed':
-            print(f'Title Agent: Run failed - {run.last_error}')
-            return [f'Error: {run.last_error}']
+            # Send user message
+            await self.client.messages.create(thread_id=thread_id, role=MessageRole.USER, content=user_message)
 
-        # Get response messages
-        messages = self.client.messages.list(thread_id=thread.id, order=ListSortOrder.DESCENDING)
-        responses = []
-        for msg in messages:
-            # Only get the latest assistant response
-            if msg.role == MessageRole.AGENT and msg.text_messages:
-                for text_msg in msg.text_messages:
-                    responses.append(text_msg.text.value)
-                break 
+            # Create and run the agent, consuming its event stream
+            async with await self.client.runs.stream(thread_id=thread_id, agent_id=self.agent.id) as stream:
+                async for event_type, event_data, _ in stream:
+                    if isinstance(event_data, MessageDeltaChunk):
+                        yield event_data.text
+                    elif isinstance(event_data, ThreadRun) and event_data.status == 'failed':
+                        raise RuntimeError(f'Run failed - {event_data.last_error}')
+                    elif event_type == AgentStreamEvent.ERROR:
+                        raise RuntimeError(f'Run stream error - {event_data}')
+                    elif event_type == AgentStreamEvent.DONE:
+                        break
 
-        return responses if responses else ['No response received']
+    async def close(self) -> None:
+        # Delete the pooled threads and the agent, then release the client sessions
+        await self.threads.close()
+        if self.agent:
+            await self.client.delete_agent(self.agent.id)
+            self.agent = None
+        await self.client.close()
+        if self.credential:
+            await self.credential.close()
 
 async def create_foundry_title_agent() -> TitleAgent:
     agent = TitleAgent()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Azure OpenAI Batch API helpers for offline image analysis.
+
+Chat completion requests are written to JSONL input files (split to stay under
+the service's per-file limits), uploaded, submitted as batch jobs and polled
+until they finish. The output and error files are then streamed back line by
+line so they can be merged into the analyze_folder result schema.
+"""
+
+import json
+import os
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+BATCH_ENDPOINT = "/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Azure OpenAI limits: 200 MB and 100,000 requests per input file
+MAX_FILE_BYTES = 190 * 1024 * 1024
+MAX_REQUESTS_PER_FILE = 100_000
+
+
+def write_batch_files(requests: Iterable[dict], directory: str, max_file_bytes: int = MAX_FILE_BYTES,
+                      max_requests: int = MAX_REQUESTS_PER_FILE) -> List[str]:
+    """Stream batch requests into as many JSONL input files as the limits require"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    current = None
+    size = count = 0
+    try:
+        for request in requests:
+            line = (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+            if current is None or size + len(line) > max_file_bytes or count >= max_requests:
+                if current:
+                    current.close()
+                path = os.path.join(directory, f"batch_input_{len(paths) + 1:04d}.jsonl")
+                current = open(path, "wb")
+                paths.append(path)
+                size = count = 0
+            current.write(line)
+            size += len(line)
+            count += 1
+    finally:
+        if current:
+            current.close()
+    return paths
+
+
+def submit_batch(client, input_path: str, poll_interval: float = 5.0):
+    """Upload an input file and create the batch job"""
+    with open(input_path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+
+    # The file must be processed before a batch can reference it
+    while input_file.status not in ("processed", "error"):
+        time.sleep(poll_interval)
+        input_file = client.files.retrieve(input_file.id)
+    if input_file.status == "error":
+        raise RuntimeError(f"Batch input file {input_path} was rejected: {input_file.status_details}")
+
+    return client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+
+
+def wait_for_batch(client, batch_id: str, poll_interval: float = 30.0,
+                   on_status: Optional[Callable] = None):
+    """Poll a batch job until it reaches a terminal status"""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if on_status:
+            on_status(batch)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def iter_batch_output(client, batch) -> Iterator[dict]:
+    """Yield every line of the batch output and error files"""
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        content = client.files.content(file_id)
+        for line in content.iter_lines():
+            if line.strip():
+                yield json.loads(line)
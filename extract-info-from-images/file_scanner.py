@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Single-pass, parallel directory scanner for image folders.
+
+Walks the tree once with os.scandir, matching extensions case-insensitively,
+instead of running one recursive glob per extension and per case. Directories
+are scanned concurrently (directory listing is I/O bound, which matters on
+network mounts) and files are yielded as soon as their directory has been
+listed, so analysis can start before the scan finishes. Symlinked directories
+are followed, as glob does, but every directory is listed only once so links
+back up the tree do not loop.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, List, Optional, Set, Tuple
+
+
+def parse_extensions(extensions: str) -> Set[str]:
+    """Turn 'jpg,PNG, .webp' into {'.jpg', '.png', '.webp'}"""
+    return {"." + ext.strip().lower().lstrip(".") for ext in extensions.split(",") if ext.strip()}
+
+
+DirectoryKey = Tuple[int, int]
+
+
+def _directory_key(path: str) -> Optional[DirectoryKey]:
+    """(device, inode) identifying a directory however it is reached, None if it cannot be read"""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_dev, info.st_ino
+
+
+def _scan_directory(directory: str, suffixes: Set[str]) -> Tuple[List[str], List[Tuple[str, DirectoryKey]]]:
+    """List one directory, returning (matching files, (subdirectory, key) pairs)"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Hidden entries are skipped, as glob does
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir():
+                        info = entry.stat()
+                        subdirs.append((entry.path, (info.st_dev, info.st_ino)))
+                    elif os.path.splitext(entry.name)[1].lower() in suffixes and entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def iter_image_files(folder_path: str, extensions: str, workers: int = 8) -> Iterator[str]:
+    """Lazily yield every file under folder_path whose extension is in the comma-separated list"""
+    suffixes = parse_extensions(extensions)
+    visited = {_directory_key(folder_path)}
+
+    def unvisited(subdirs: List[Tuple[str, DirectoryKey]]) -> Iterator[str]:
+        for subdir, key in subdirs:
+            if key not in visited:
+                visited.add(key)
+                yield subdir
+
+    if workers <= 1:
+        stack = [folder_path]
+        while stack:
+            files, subdirs = _scan_directory(stack.pop(), suffixes)
+            stack.extend(unvisited(subdirs))
+            yield from files
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    pending = {executor.submit(_scan_directory, folder_path, suffixes)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in unvisited(subdirs):
+                    pending.add(executor.submit(_scan_directory, subdir, suffixes))
+                yield from files
+    finally:
+        # The consumer may stop before the scan finishes
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -7,24 +7,27 @@ to fetch additional information and generate markdown reports with external link
 
 import os
 import sys
-import base64
 import click
 import json
 import asyncio
 import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Dict, List, Any
 from datetime import datetime
-import io
 
-from PIL import Image
 from dotenv import load_dotenv
 from azure.ai.projects import AIProjectClient
 from azure.ai.projects.models import Connection
 from azure.ai.agents.models import BingCustomSearchTool, MessageRole
-from azure.ai.agents.models import RunStatus, SubmitToolOutputsAction
+from azure.ai.agents.models import RunStatus, AgentStreamEvent, MessageDeltaChunk, ThreadRun
 from azure.identity import DefaultAzureCredential
 from azure.core.credentials import AzureKeyCredential
+from image_preprocessing import encode_image
+from file_scanner import iter_image_files
 # Load environment variables
 load_dotenv()
 
@@ -38,11 +41,100 @@ handler.setFormatter(formatter)
 if not logger.hasHandlers():
     logger.addHandler(handler)
 
+class AgentThreadPool:
+    """Pool of Foundry conversation threads, leased for one run at a time.
+
+    Runs on the same thread serialize on the service side and share message
+    history, so each parallel worker gets its own thread. A thread is recycled
+    (deleted and replaced on demand) after `max_runs_per_thread` runs or when it
+    has been idle longer than `idle_timeout` seconds.
+    """
+
+    def __init__(self, agents_client, size: int, max_runs_per_thread: int = 10, idle_timeout: float = 300.0):
+        self.agents_client = agents_client
+        self.size = max(1, size)
+        self.max_runs_per_thread = max_runs_per_thread
+        self.idle_timeout = idle_timeout
+        self._idle = []  # [thread, runs, last_used]
+        self._leased = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def lease(self):
+        """Check out a thread for the duration of the block"""
+        entry = self._checkout()
+        try:
+            yield entry[0]
+        finally:
+            self._checkin(entry)
+
+    def _checkout(self) -> list:
+        stale = []
+        entry = None
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while self._idle and entry is None:
+                    candidate = self._idle.pop()
+                    if now - candidate[2] <= self.idle_timeout:
+                        entry = candidate
+                    else:
+                        stale.append(candidate[0])
+                if entry or self._leased < self.size:
+                    self._leased += 1
+                    break
+                self._condition.wait()
+
+        # Service calls happen outside the lock
+        for thread in stale:
+            self._delete(thread)
+        if entry:
+            return entry
+
+        try:
+            thread = self.agents_client.threads.create()
+        except Exception:
+            with self._condition:
+                self._leased -= 1
+                self._condition.notify()
+            raise
+        logger.info(f"Created pooled thread with ID: {thread.id}")
+        return [thread, 0, time.monotonic()]
+
+    def _checkin(self, entry: list):
+        entry[1] += 1
+        entry[2] = time.monotonic()
+        recycle = entry[1] >= self.max_runs_per_thread
+        with self._condition:
+            self._leased -= 1
+            if not recycle:
+                self._idle.append(entry)
+            self._condition.notify()
+        if recycle:
+            self._delete(entry[0])
+
+    def _delete(self, thread):
+        try:
+            self.agents_client.threads.delete(thread.id)
+        except Exception as e:
+            logger.warning(f"Failed to delete thread {thread.id}: {e}")
+
+    def close(self):
+        """Delete every idle thread"""
+        with self._condition:
+            while self._idle:
+                self._delete(self._idle.pop()[0])
+
+
 class FoundryImageAgent:
     """AI Foundry Agent for image analysis with Bing grounding"""
     
-    def __init__(self):
-        """Initialize the AI Foundry client and agent"""
+    def __init__(self, run_mode: str = "stream"):
+        """Initialize the AI Foundry client and agent
+
+        run_mode: "stream" consumes the run event stream, "poll" polls the run with exponential backoff
+        """
+        self.run_mode = run_mode
         self.project_endpoint = os.getenv("AZURE_AI_PROJECT_ENDPOINT")
         self.api_key = os.getenv("AZURE_AI_PROJECT_API_KEY")
         self.bing_connection_id = os.getenv("BING_CONNECTION_ID")
@@ -72,37 +164,11 @@ class FoundryImageAgent:
 
         self.agent = None
         self.thread = None
+        self.thread_pool: Optional[AgentThreadPool] = None
     
     def encode_image(self, image_path: str) -> str:
         """Encode image to base64 string"""
-        try:
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Image file not found: {image_path}")
-            
-            # Validate and optimize image
-            try:
-                with Image.open(image_path) as img:
-                    # Resize if image is too large
-                    max_size = (2048, 2048)
-                    if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    
-                    # Convert to RGB if necessary
-                    if img.mode in ("RGBA", "P"):
-                        img = img.convert("RGB")
-                    
-                    # Save to bytes
-                    img_byte_arr = io.BytesIO()
-                    img.save(img_byte_arr, format='JPEG', quality=85)
-                    img_byte_arr = img_byte_arr.getvalue()
-                    
-                    return base64.b64encode(img_byte_arr).decode('utf-8')
-            
-            except Exception as e:
-                raise ValueError(f"Invalid image file: {e}")
-                
-        except Exception as e:
-            raise Exception(f"Error processing image: {e}")
+        return encode_image(image_path)
     
     def create_agent(self):
         """Create an AI agent with Bing grounding capabilities"""
@@ -179,11 +245,35 @@ class FoundryImageAgent:
         except Exception as e:
             raise Exception(f"Error creating thread: {e}")
     
-    def analyze_image_with_research(self, image_path: str, custom_prompt: Optional[str] = None) -> Dict[str, Any]:
+    def create_thread_pool(self, size: int, max_runs_per_thread: int = 10, idle_timeout: float = 300.0):
+        """Create a pool of threads so `size` parallel analyses each run on their own thread"""
+        self.thread_pool = AgentThreadPool(self.agents_client, size, max_runs_per_thread, idle_timeout)
+        click.echo(f"Created thread pool of up to {self.thread_pool.size} threads")
+        return self.thread_pool
+
+    def analyze_image_with_research(self, image_path: str, custom_prompt: Optional[str] = None,
+                                    base64_image: Optional[str] = None) -> Dict[str, Any]:
         """Analyze image and research additional information"""
+        if not self.thread_pool:
+            return self._analyze_on_thread(self.thread, image_path, custom_prompt, base64_image)
+
+        try:
+            with self.thread_pool.lease() as thread:
+                return self._analyze_on_thread(thread, image_path, custom_prompt, base64_image)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "image_path": image_path
+            }
+
+    def _analyze_on_thread(self, thread, image_path: str, custom_prompt: Optional[str],
+                           base64_image: Optional[str]) -> Dict[str, Any]:
+        """Run the analysis of one image on `thread`"""
         try:
-            logger.info(f"Encoding image: {image_path}")
-            base64_image = self.encode_image(image_path)
+            if base64_image is None:
+                logger.info(f"Encoding image: {image_path}")
+                base64_image = self.encode_image(image_path)
             
             # Create prompt
             if custom_prompt:
@@ -222,46 +312,34 @@ class FoundryImageAgent:
 
             
             self.agents_client.messages.create(
-                    thread_id=self.thread.id,
+                    thread_id=thread.id,
                     role="user",
                     content="Give information about each location:"+ prompt
             )
             
             
             self.agents_client.messages.create(
-                thread_id=self.thread.id,
+                thread_id=thread.id,
                 role="user",
                 content=message_content
             )
             
             # Create and run the analysis
             logger.info(f"Starting analysis for image: {image_path}")   
-            run = self.agents_client.runs.create_and_process(
-                thread_id=self.thread.id,
-                agent_id=self.agent.id
-            )
-            
-            # Wait for completion
-            while run.status in [RunStatus.QUEUED, RunStatus.IN_PROGRESS, RunStatus.REQUIRES_ACTION]:
-                run = self.project_client.agents.get_run(thread_id=self.thread.id, run_id=run.id)
-                
-                if run.status == RunStatus.REQUIRES_ACTION:
-                    # Handle tool calls if needed
-                    required_action = run.required_action
-                    if isinstance(required_action, SubmitToolOutputsAction):
-                        tool_outputs = []
-                        for tool_call in required_action.submit_tool_outputs.tool_calls:
-                            # Tool outputs are handled automatically by the agent
-                            pass
-                
-                # Small delay to avoid overwhelming the API
-                import time
-                time.sleep(1)
+            started = time.perf_counter()
+            if self.run_mode == "stream":
+                run, first_token_at = self._stream_run(thread)
+            else:
+                run, first_token_at = self._poll_run(thread), None
+            timings = {
+                "time_to_first_token": round(first_token_at - started, 3) if first_token_at else None,
+                "run_latency": round(time.perf_counter() - started, 3)
+            }
             
             if run.status == RunStatus.COMPLETED:
                 # Get messages from the thread
                 messages = self.agents_client.messages.list(
-                    thread_id=self.thread.id)
+                    thread_id=thread.id)
                 #for msg in messages:
                 #    logger.info(f"===  message: {json.dumps(msg.as_dict(), indent=2)}")
 
@@ -283,7 +361,7 @@ class FoundryImageAgent:
                    
 
                     """ run_steps = self.project_client.agents.list_run_steps(
-                        thread_id=self.thread.id, 
+                        thread_id=thread.id, 
                         run_id=run.id
                     ) """
                     
@@ -294,10 +372,11 @@ class FoundryImageAgent:
                         "analysis": response_content,
                         "image_path": image_path,
                         "run_id": run.id,
-                        "thread_id": self.thread.id,
+                        "thread_id": thread.id,
                         "urls": urls,
                         #"run_steps": [step.dict() for step in run_steps.data] if run_steps.data else [],
-                        "model": self.model_deployment_name
+                        "model": self.model_deployment_name,
+                        "timings": timings
                     }
                 else:
                     return {
@@ -310,7 +389,8 @@ class FoundryImageAgent:
                     "success": False,
                     "error": f"Run failed with status: {json.dumps(run.as_dict(), indent=2)}",
                     #"run_info": json.dumps(run.dict(), indent=2),
-                    "image_path": image_path
+                    "image_path": image_path,
+                    "timings": timings
                 }
                 
         except Exception as e:
@@ -320,9 +400,42 @@ class FoundryImageAgent:
                 "image_path": image_path
             }
     
+    def _stream_run(self, thread):
+        """Run the agent on `thread` consuming the event stream; returns (run, first token time)"""
+        run = None
+        first_token_at = None
+        with self.agents_client.runs.stream(thread_id=thread.id, agent_id=self.agent.id) as stream:
+            for event_type, event_data, _ in stream:
+                if isinstance(event_data, MessageDeltaChunk):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                elif isinstance(event_data, ThreadRun):
+                    run = event_data
+                elif event_type == AgentStreamEvent.ERROR:
+                    raise RuntimeError(f"Run stream error: {event_data}")
+                elif event_type == AgentStreamEvent.DONE:
+                    break
+
+        if run is None:
+            raise RuntimeError("Run stream ended without run status")
+        return run, first_token_at
+
+    def _poll_run(self, thread, initial_delay: float = 0.25, max_delay: float = 4.0):
+        """Run the agent on `thread` polling with exponential backoff and full jitter"""
+        run = self.agents_client.runs.create(thread_id=thread.id, agent_id=self.agent.id)
+        delay = initial_delay
+        while run.status in [RunStatus.QUEUED, RunStatus.IN_PROGRESS, RunStatus.REQUIRES_ACTION]:
+            # Bing grounding runs server side, there are no client tool calls to submit
+            time.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, max_delay)
+            run = self.agents_client.runs.get(thread_id=thread.id, run_id=run.id)
+        return run
+
     def cleanup(self):
         """Clean up resources"""
         try:
+            if self.thread_pool:
+                self.thread_pool.close()
             if self.agent:
                 self.project_client.agents.delete_agent(self.agent.id)
                 click.echo("Deleted agent")
@@ -403,7 +516,10 @@ def setup():
 @click.option('--output', '-o', type=click.Path(), help='Output file for markdown report')
 @click.option('--verbose', '-v', is_flag=True, help='Verbose output')
 @click.option('--keep-agent', '-k', is_flag=True, help='Keep agent after analysis (for multiple runs)')
-def analyze(image_path: str, prompt: Optional[str], output: Optional[str], verbose: bool, keep_agent: bool):
+@click.option('--run-mode', type=click.Choice(['stream', 'poll']), default='stream',
+              help='Wait for the run by consuming its event stream or by polling (default: stream)')
+def analyze(image_path: str, prompt: Optional[str], output: Optional[str], verbose: bool, keep_agent: bool,
+            run_mode: str):
     """
     Analyze an image and research additional information using AI Foundry Agent with Bing grounding.
     
@@ -415,7 +531,7 @@ def analyze(image_path: str, prompt: Optional[str], output: Optional[str], verbo
             click.echo(f"Initializing AI Foundry Agent...")
         
         # Initialize agent
-        agent_client = FoundryImageAgent()
+        agent_client = FoundryImageAgent(run_mode=run_mode)
         
         # Create agent and thread
         agent_client.create_agent()
@@ -437,6 +553,10 @@ def analyze(image_path: str, prompt: Optional[str], output: Optional[str], verbo
             click.echo(f"Image: {result['image_path']}")
             click.echo(f"Model: {result['model']}")
             click.echo(f"Analysis ID: {result['run_id']}")
+            if verbose:
+                timings = result["timings"]
+                click.echo(f"Time to first token: {timings['time_to_first_token']}s, "
+                           f"run latency: {timings['run_latency']}s")
             click.echo("-"*80)
             click.echo(result["analysis"])
             click.echo("-"*80)
@@ -496,41 +616,38 @@ def analyze(image_path: str, prompt: Optional[str], output: Optional[str], verbo
 @click.option('--verbose', '-v', is_flag=True, help='Verbose output')
 @click.option('--extensions', '-e', default='jpg,jpeg,png,gif,bmp,tiff,webp', 
               help='Comma-separated list of image extensions to process')
-@click.option('--max-images', '-m', type=int, help='Maximum number of images to process')
+@click.option('--max-images', '-m', type=int, help='Maximum number of images to process, the first ones in path order')
+@click.option('--run-mode', type=click.Choice(['stream', 'poll']), default='stream',
+              help='Wait for each run by consuming its event stream or by polling (default: stream)')
+@click.option('--scan-workers', default=8, type=int, help='Threads listing subdirectories in parallel (default: 8)')
 def analyze_batch(folder_path: str, prompt: Optional[str], output_dir: Optional[str], 
-                 verbose: bool, extensions: str, max_images: Optional[int]):
+                 verbose: bool, extensions: str, max_images: Optional[int], run_mode: str, scan_workers: int):
     """
     Analyze multiple images in a folder and generate individual research reports.
     
     FOLDER_PATH: Path to the folder containing images to analyze
     """
-    import glob
+    import itertools
     
     agent_client = None
     try:
         if verbose:
             click.echo(f"Scanning folder: {folder_path}")
         
-        # Parse extensions and find images
-        ext_list = [ext.strip().lower() for ext in extensions.split(',')]
-        image_files = []
+        # Find images lazily so the first analysis starts before the scan finishes
+        image_files = iter_image_files(folder_path, extensions, scan_workers)
+        first = next(image_files, None)
         
-        for ext in ext_list:
-            pattern = os.path.join(folder_path, f"**/*.{ext}")
-            image_files.extend(glob.glob(pattern, recursive=True))
-            pattern = os.path.join(folder_path, f"**/*.{ext.upper()}")
-            image_files.extend(glob.glob(pattern, recursive=True))
-        
-        image_files = sorted(list(set(image_files)))
-        
-        if not image_files:
+        if first is None:
             click.echo(f"No image files found in {folder_path}")
             return
+        image_files = itertools.chain([first], image_files)
         
         # Limit number of images if specified
-        if max_images and len(image_files) > max_images:
-            image_files = image_files[:max_images]
-            click.echo(f"Limited to first {max_images} images")
+        if max_images:
+            # The scan order varies between runs, the limit keeps the first images in path order
+            image_files = sorted(image_files)[:max_images]
+            click.echo(f"Limited to the first {max_images} images")
         
         # Setup output directory
         if output_dir:
@@ -540,10 +657,8 @@ def analyze_batch(folder_path: str, prompt: Optional[str], output_dir: Optional[
         
         output_path.mkdir(exist_ok=True)
         
-        click.echo(f"Found {len(image_files)} images to analyze")
-        
         # Initialize agent (reuse for all images)
-        agent_client = FoundryImageAgent()
+        agent_client = FoundryImageAgent(run_mode=run_mode)
         agent_client.create_agent()
         agent_client.create_thread()
         
@@ -612,7 +727,7 @@ def analyze_batch(folder_path: str, prompt: Optional[str], output_dir: Optional[
 
 **Processed:** {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}  
 **Folder:** {folder_path}  
-**Total Images:** {len(image_files)}  
+**Total Images:** {len(results)}  
 **Successful:** {successful}  
 **Failed:** {failed}
 
@@ -639,7 +754,7 @@ def analyze_batch(folder_path: str, prompt: Optional[str], output_dir: Optional[
         click.echo(f"\nBatch analysis complete!")
         click.echo(f"Reports saved to: {output_path}")
         click.echo(f"Summary: {summary_path}")
-        click.echo(f"Successfully analyzed: {successful}/{len(image_files)} images")
+        click.echo(f"Successfully analyzed: {successful}/{len(results)} images")
         
     except Exception as e:
         click.echo(f"Unexpected error: {e}", err=True)
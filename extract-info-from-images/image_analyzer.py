@@ -5,16 +5,14 @@ CLI tool for extracting information from images using Azure OpenAI GPT-4 Vision
 
 import os
 import sys
-import base64
 import click
 from pathlib import Path
 from typing import Optional
 import json
-from PIL import Image
-import io
+import asyncio
 
 try:
-    from openai import AzureOpenAI
+    from openai import AzureOpenAI, AsyncAzureOpenAI, RateLimitError
     from azure.identity import DefaultAzureCredential
     from dotenv import load_dotenv
 except ImportError as e:
@@ -25,18 +23,31 @@ except ImportError as e:
 # Load environment variables
 load_dotenv()
 from foundry_image_agent import FoundryImageAgent
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from result_cache import ResultCache
+from image_preprocessing import ImagePreprocessor, encode_image, benchmark_detail_policy, LOW_DETAIL_TOKENS
+from result_stream import JsonlResultWriter, load_completed, summarize, read_results, write_json_report
+from image_dedup import dhash, group_duplicates
+from file_scanner import iter_image_files
+from batch_analysis import BATCH_ENDPOINT, write_batch_files, submit_batch, wait_for_batch, iter_batch_output
+
+# Approximate prompt tokens for one 2048px high-detail image, used to reserve TPM budget
+IMAGE_TOKEN_ESTIMATE = 1105
 
 
 
 class ImageAnalyzer:
     """Azure OpenAI GPT-4 Vision image analyzer"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[ResultCache] = None):
         """Initialize the Azure OpenAI client"""
+        self.cache = cache
         self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
         self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
         self.deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "extimage-gpt-4.1-mini")
         self.api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
+        # Batch files and jobs need 2024-07-01-preview or later
+        self.batch_api_version = os.getenv("AZURE_OPENAI_BATCH_API_VERSION", "2024-10-21")
         
         if not self.endpoint:
             raise ValueError(
@@ -53,102 +64,228 @@ class ImageAnalyzer:
             )
         else:
             # Use Azure Default Credential (recommended for production)
-            credential = DefaultAzureCredential()
+            self.credential = DefaultAzureCredential()
             self.client = AzureOpenAI(
-                azure_ad_token_provider=lambda: credential.get_token("https://cognitiveservices.azure.com/.default").token,
+                azure_ad_token_provider=self._get_token,
                 api_version=self.api_version,
                 azure_endpoint=self.endpoint
             )
+
+        # Created on first use by the asyncio engine and by analyze-batch-offline
+        self._async_client = None
+        self._batch_client = None
+
+    def _get_token(self) -> str:
+        return self.credential.get_token("https://cognitiveservices.azure.com/.default").token
+
+    @property
+    def async_client(self) -> AsyncAzureOpenAI:
+        """Async client used by analyze_image_async (SDK retries disabled, the rate limiter owns them)"""
+        if self._async_client is None:
+            auth = {"api_key": self.api_key} if self.api_key else {"azure_ad_token_provider": self._get_token}
+            self._async_client = AsyncAzureOpenAI(
+                api_version=self.api_version,
+                azure_endpoint=self.endpoint,
+                max_retries=0,
+                **auth
+            )
+        return self._async_client
+
+    @property
+    def batch_client(self) -> AzureOpenAI:
+        """Client used by analyze-batch-offline, on an API version that supports the Batch API"""
+        if self._batch_client is None:
+            auth = {"api_key": self.api_key} if self.api_key else {"azure_ad_token_provider": self._get_token}
+            self._batch_client = AzureOpenAI(
+                api_version=self.batch_api_version,
+                azure_endpoint=self.endpoint,
+                **auth
+            )
+        return self._batch_client
     
     def encode_image(self, image_path: str) -> str:
         """Encode image to base64 string"""
-        try:
-            # Validate image file
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Image file not found: {image_path}")
-            
-            # Check if it's a valid image
-            try:
-                with Image.open(image_path) as img:
-                    # Resize if image is too large (OpenAI has size limits)
-                    max_size = (2048, 2048)
-                    if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    
-                    # Convert to RGB if necessary
-                    if img.mode in ("RGBA", "P"):
-                        img = img.convert("RGB")
-                    
-                    # Save to bytes
-                    img_byte_arr = io.BytesIO()
-                    img.save(img_byte_arr, format='JPEG', quality=85)
-                    img_byte_arr = img_byte_arr.getvalue()
-                    
-                    return base64.b64encode(img_byte_arr).decode('utf-8')
-            
-            except Exception as e:
-                raise ValueError(f"Invalid image file: {e}")
-                
-        except Exception as e:
-            raise Exception(f"Error processing image: {e}")
+        return encode_image(image_path)
     
-    def analyze_image(self, image_path: str, prompt: Optional[str] = None, max_tokens: int = 2000) -> dict:
-        """Analyze image using GPT-4 Vision"""
+    def _build_messages(self, base64_image: str, prompt: Optional[str], detail: Optional[str] = None) -> list:
+        """Build the chat messages for an encoded image (`detail`: low, high or auto; omitted if None)"""
+        # Default prompt if none provided
+        if not prompt:
+            prompt = (
+                "Analyze this image in detail. Describe what you see, including:"
+                "- Main objects, people, or subjects"
+                "- Text content (if any)"
+                "- Colors, setting, and atmosphere"
+                "- Any notable details or interesting features"
+                "- Context or purpose of the image"
+                "Provide a comprehensive but organized description."
+            )
+
+        image_url = {"url": f"data:image/jpeg;base64,{base64_image}"}
+        if detail:
+            image_url["detail"] = detail
+
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": image_url
+                    }
+                ]
+            }
+        ]
+
+    def _build_result(self, response, image_path: str) -> dict:
+        """Convert a chat completion response into the result dict"""
+        return {
+            "success": True,
+            "analysis": response.choices[0].message.content,
+            "usage": {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            },
+            "model": self.deployment_name,
+            "image_path": image_path
+        }
+
+    def _cache_lookup(self, image_path: str, prompt: Optional[str], max_tokens: int, detail: Optional[str] = None):
+        """Return (cache key, cached result or None); (None, None) when caching is disabled"""
+        if not self.cache:
+            return None, None
+        key = ResultCache.make_key(image_path, prompt, self.deployment_name, max_tokens, detail)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cached.update({"image_path": image_path, "cached": True})
+        return key, cached
+
+    def _cache_store(self, key: Optional[str], result: dict):
+        if key and result["success"]:
+            self.cache.put(key, {k: v for k, v in result.items() if k != "image_path"})
+
+    def build_batch_request(self, custom_id: str, base64_image: str, prompt: Optional[str] = None,
+                            max_tokens: int = 2000) -> dict:
+        """Build one line of a Batch API input file"""
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": self.deployment_name,
+                "messages": self._build_messages(base64_image, prompt),
+                "max_tokens": max_tokens,
+                "temperature": 0.3
+            }
+        }
+
+    def result_from_batch_output(self, line: dict, image_path: str) -> dict:
+        """Convert one line of a Batch API output or error file into the result dict"""
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+            return {
+                "success": False,
+                "error": error.get("message", str(error)) if isinstance(error, dict) else str(error),
+                "image_path": image_path
+            }
+
+        usage = body.get("usage", {})
+        return {
+            "success": True,
+            "analysis": body["choices"][0]["message"]["content"],
+            "usage": {
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0)
+            },
+            "model": self.deployment_name,
+            "image_path": image_path
+        }
+
+    def analyze_image(self, image_path: str, prompt: Optional[str] = None, max_tokens: int = 2000,
+                      base64_image: Optional[str] = None, detail: Optional[str] = None) -> dict:
+        """Analyze image using GPT-4 Vision (pass `base64_image` to reuse an already encoded payload)"""
         try:
+            key, cached = self._cache_lookup(image_path, prompt, max_tokens, detail)
+            if cached is not None:
+                return cached
+
             # Encode image
-            base64_image = self.encode_image(image_path)
-            
-            # Default prompt if none provided
-            if not prompt:
-                prompt = (
-                    "Analyze this image in detail. Describe what you see, including:"
-                    "- Main objects, people, or subjects"
-                    "- Text content (if any)"
-                    "- Colors, setting, and atmosphere"
-                    "- Any notable details or interesting features"
-                    "- Context or purpose of the image"
-                    "Provide a comprehensive but organized description."
-                )
-            
-            # Prepare the message
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ]
+            if base64_image is None:
+                base64_image = self.encode_image(image_path)
             
             # Call Azure OpenAI
             response = self.client.chat.completions.create(
                 model=self.deployment_name,
-                messages=messages,
+                messages=self._build_messages(base64_image, prompt, detail),
                 max_tokens=max_tokens,
                 temperature=0.3
             )
             
+            result = self._build_result(response, image_path)
+            self._cache_store(key, result)
+            return result
+            
+        except Exception as e:
             return {
-                "success": True,
-                "analysis": response.choices[0].message.content,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                },
-                "model": self.deployment_name,
+                "success": False,
+                "error": str(e),
                 "image_path": image_path
             }
-            
+
+    async def analyze_image_async(self, image_path: str, prompt: Optional[str] = None, max_tokens: int = 2000,
+                                  limiter: Optional[AdaptiveRateLimiter] = None, max_retries: int = 6,
+                                  base64_image: Optional[str] = None, detail: Optional[str] = None) -> dict:
+        """Analyze image using GPT-4 Vision on the async client, throttled by `limiter`"""
+        try:
+            key, cached = await asyncio.to_thread(self._cache_lookup, image_path, prompt, max_tokens, detail)
+            if cached is not None:
+                return cached
+
+            # Encoding is CPU bound, keep it off the event loop
+            if base64_image is None:
+                base64_image = await asyncio.to_thread(self.encode_image, image_path)
+            messages = self._build_messages(base64_image, prompt, detail)
+
+            # Rough reservation: completion budget + image + prompt text, corrected after the call
+            image_tokens = LOW_DETAIL_TOKENS if detail == "low" else IMAGE_TOKEN_ESTIMATE
+            estimated_tokens = max_tokens + image_tokens + len(messages[0]["content"][0]["text"]) // 4
+
+            for attempt in range(max_retries + 1):
+                if limiter:
+                    await limiter.acquire(estimated_tokens)
+                try:
+                    raw = await self.async_client.chat.completions.with_raw_response.create(
+                        model=self.deployment_name,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=0.3
+                    )
+                except RateLimitError as e:
+                    if attempt == max_retries:
+                        raise
+                    retry_after = parse_retry_after(e.response.headers, default=2 ** attempt)
+                    if limiter:
+                        limiter.record_throttle(retry_after)
+                    else:
+                        await asyncio.sleep(retry_after)
+                    continue
+
+                response = raw.parse()
+                if limiter:
+                    limiter.refund(estimated_tokens - response.usage.total_tokens)
+                    limiter.record_success(raw.headers)
+                result = self._build_result(response, image_path)
+                await asyncio.to_thread(self._cache_store, key, result)
+                return result
+
         except Exception as e:
             return {
                 "success": False,
@@ -215,6 +352,68 @@ def analyze(image_path: str, prompt: Optional[str], max_tokens: int, output: Opt
         sys.exit(1)
 
 
+def find_image_files(folder_path: str, extensions: str, scan_workers: int = 8) -> list:
+    """Sorted list of image files under folder_path for a comma-separated list of extensions"""
+    return sorted(iter_image_files(folder_path, extensions, scan_workers))
+
+
+def report_folder_results(results: dict, output: str, checkpoint: str, verbose: bool):
+    """Summarize the checkpoint into `results`, display the summary and write the JSON report"""
+    # Calculate summary statistics by streaming over the checkpoint (cached results cost no tokens),
+    # the index is sorted by relative path for consistent output
+    summary = summarize(checkpoint)
+    index = summary.pop("index")
+    results.update(summary)
+    total_tokens = results["total_tokens_used"]
+    
+    # Display summary
+    click.echo("\n" + "="*60)
+    click.echo("FOLDER ANALYSIS SUMMARY")
+    click.echo("="*60)
+    click.echo(f"Folder: {results['folder_path']}")
+    click.echo(f"Total images found: {results['total_images']}")
+    click.echo(f"Successfully analyzed: {results['successful_analyses']}")
+    click.echo(f"Failed analyses: {results['failed_analyses']}")
+    click.echo(f"Total tokens used: {total_tokens}")
+    if results.get("deduplicated_analyses"):
+        click.echo(f"Near-duplicates reusing a result: {results['deduplicated_analyses']}")
+    if "cache" in results:
+        click.echo(f"Cache hits: {results['cache']['hits']}, misses: {results['cache']['misses']}, "
+                   f"evictions: {results['cache']['evictions']}")
+    if "rate_limit" in results:
+        click.echo(f"Throttled requests (429): {results['rate_limit']['throttled_requests']}, "
+                   f"seconds waited: {results['rate_limit']['seconds_waited']}")
+    click.echo("="*60)
+    
+    # Display individual results if verbose or small number of images
+    if verbose or len(index) <= 5:
+        for result in read_results(checkpoint, index):
+            #
+            # click.echo(f"\n--- {result['relative_path']} ---")
+            click.echo(f"\n--------------")
+            if result["success"]:
+                click.echo(result["analysis"])
+                #if verbose:
+                #    usage = result.get("usage", {})
+                #    click.echo(f"[Tokens: {usage.get('total_tokens', 'N/A')}]")
+            else:
+                click.echo(f"ERROR: {result['error']}")
+    elif results["successful_analyses"] > 0:
+        click.echo(f"\nUse --verbose flag to see individual analysis results, or check the output file.")
+    
+    # Show failed images if any
+    if results["failed_analyses"] > 0:
+        click.echo(f"\nFailed to analyze {results['failed_analyses']} images:")
+        for result in read_results(checkpoint, index):
+            if not result["success"]:
+                click.echo(f"  ✗ {result['relative_path']}: {result['error']}")
+    
+    # Save to output file
+    write_json_report(output, results, checkpoint, index)
+    click.echo(f"\nDetailed results saved to: {output}")
+    click.echo(f"Per-image results streamed to: {checkpoint}")
+
+
 @click.group()
 def cli():
     """
@@ -225,6 +424,8 @@ def cli():
     Commands:
     - analyze: Analyze a single image
     - analyze-folder: Analyze all images in a folder
+    - analyze-batch-offline: Analyze a folder through the Batch API
+    - benchmark-detail: Estimate tokens saved by the adaptive detail policy
     - setup: Check configuration
     
     Setup:
@@ -286,62 +487,108 @@ def setup():
 @click.option('--extensions', '-e', default='jpg,jpeg,png,gif,bmp,tiff,webp', 
               help='Comma-separated list of image extensions to process (default: jpg,jpeg,png,gif,bmp,tiff,webp)')
 @click.option('--parallel', '-j', default=1, type=int, help='Number of parallel processing threads (default: 1)')
+@click.option('--concurrency', '-c', default=0, type=int,
+              help='Use the asyncio engine with this many in-flight requests (default: 0, thread engine)')
+@click.option('--rpm', type=int, help='Requests per minute allowed by the asyncio engine (default: unlimited)')
+@click.option('--tpm', type=int, help='Tokens per minute allowed by the asyncio engine (default: unlimited)')
+@click.option('--cache/--no-cache', default=False, help='Reuse results of unchanged images from the on-disk cache')
+@click.option('--cache-path', default='.image_analysis_cache.sqlite', type=click.Path(dir_okay=False),
+              help='Cache file (default: .image_analysis_cache.sqlite)')
+@click.option('--cache-size-mb', default=256, type=int, help='Cache size before LRU eviction (default: 256)')
+@click.option('--preprocess-workers', type=int, help='Processes used to decode and resize images (default: CPU count)')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='JSONL file results are streamed to (default: output file with a .jsonl extension)')
+@click.option('--resume', is_flag=True, help='Skip images already analyzed successfully in the checkpoint file')
+@click.option('--run-mode', type=click.Choice(['stream', 'poll']), default='stream',
+              help='Wait for Foundry research runs by streaming events or by polling (default: stream)')
+@click.option('--dedup/--no-dedup', default=False,
+              help='Analyze one image per cluster of near-duplicates (perceptual hash) and reuse its result')
+@click.option('--dedup-threshold', default=5, type=click.IntRange(0, 64),
+              help='Maximum Hamming distance between 64-bit hashes of near-duplicates (default: 5)')
+@click.option('--scan-workers', default=8, type=int, help='Threads listing subdirectories in parallel (default: 8)')
+@click.option('--detail-policy', type=click.Choice(['fixed', 'adaptive']), default='fixed',
+              help='fixed: 2048px, JPEG q85, no detail field; adaptive: per-image resolution, quality and detail')
 def analyze_folder(folder_path: str, prompt: Optional[str], max_tokens: int, output: Optional[str], 
-                  verbose: bool, extensions: str, parallel: int):
+                  verbose: bool, extensions: str, parallel: int, concurrency: int,
+                  rpm: Optional[int], tpm: Optional[int], cache: bool, cache_path: str, cache_size_mb: int,
+                  preprocess_workers: Optional[int], checkpoint: Optional[str], resume: bool, run_mode: str,
+                  dedup: bool, dedup_threshold: int, scan_workers: int, detail_policy: str):
     """
     Analyze all images in a folder using Azure OpenAI GPT-4 Vision.
     
     FOLDER_PATH: Path to the folder containing images to analyze
     """
-    import glob
-    import threading
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    import itertools
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
     from datetime import datetime
     
     try:
+        # Results are streamed to a JSONL checkpoint, the JSON report is built from it at the end
+        if resume and not (output or checkpoint):
+            click.echo("--resume needs --output or --checkpoint to locate the previous run", err=True)
+            sys.exit(1)
+        if not output:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output = f"image_analysis_{timestamp}.json"
+        checkpoint = checkpoint or os.path.splitext(output)[0] + ".jsonl"
+        completed = load_completed(checkpoint) if resume else set()
+
         if verbose:
             click.echo(f"Scanning folder: {folder_path}")
-        
-        # Parse extensions
-        ext_list = [ext.strip().lower() for ext in extensions.split(',')]
-        
-        # Find all image files
-        image_files = []
-        for ext in ext_list:
-            pattern = os.path.join(folder_path, f"**/*.{ext}")
-            image_files.extend(glob.glob(pattern, recursive=True))
-            # Also check uppercase extensions
-            pattern = os.path.join(folder_path, f"**/*.{ext.upper()}")
-            image_files.extend(glob.glob(pattern, recursive=True))
-        
-        # Remove duplicates and sort
-        image_files = sorted(list(set(image_files)))
-        
-        if not image_files:
+
+        # Files are scanned lazily so analysis starts before the scan finishes
+        scan = {"found": 0, "skipped": 0}
+
+        def pending_images():
+            for img in iter_image_files(folder_path, extensions, scan_workers):
+                scan["found"] += 1
+                if os.path.relpath(img, folder_path) in completed:
+                    scan["skipped"] += 1
+                    continue
+                yield img
+
+        image_files = pending_images()
+        first = next(image_files, None)
+        if first is None and scan["found"] == 0:
             click.echo(f"No image files found in {folder_path} with extensions: {extensions}")
             return
-        
-        if verbose:
-            click.echo(f"Found {len(image_files)} image files")
-            for img in image_files:
-                click.echo(f"  - {os.path.relpath(img, folder_path)}")
+        image_files = itertools.chain([first], image_files) if first else iter(())
         
         # Initialize analyzer
-        analyzer = ImageAnalyzer()
-        agent_client = FoundryImageAgent()
+        result_cache = ResultCache(cache_path, cache_size_mb) if cache else None
+        analyzer = ImageAnalyzer(cache=result_cache)
+        agent_client = FoundryImageAgent(run_mode=run_mode)
         agent_client.create_agent()
-        agent_client.create_thread()
+        # One Foundry thread per in-flight image so research runs do not serialize
+        agent_client.create_thread_pool(max(parallel, concurrency, 1))
+
+        # Every image is decoded and encoded once, then shared by both clients
+        preprocessor = ImagePreprocessor(preprocess_workers, detail_policy)
+
+        # Near-duplicates: only the cluster representative is sent, its result is copied to the others
+        duplicates = {}
+        if dedup:
+            # Clustering needs the complete list
+            image_files = sorted(image_files)
+            if verbose:
+                click.echo(f"Hashing {len(image_files)} images for near-duplicate detection...")
+            hashes = list(preprocessor.map(dhash, image_files))
+            duplicates = group_duplicates(image_files, hashes, dedup_threshold)
+            image_files = list(duplicates)
+            reused = sum(len(members) for members in duplicates.values())
+            click.echo(f"Deduplication: {len(image_files)} images to analyze, {reused} near-duplicates reuse their results")
         
-        # Results storage
+        # Results storage (the per-image results live in the checkpoint file)
         results = {
             "folder_path": folder_path,
             "analyzed_at": datetime.now().isoformat(),
-            "total_images": len(image_files),
+            "total_images": 0,
             "successful_analyses": 0,
             "failed_analyses": 0,
             "prompt_used": prompt or "Default analysis prompt",
-            "images": []
+            "results_jsonl": checkpoint
         }
+        writer = JsonlResultWriter(checkpoint, append=resume)
         
         def analyze_single_image(img_path):
             """Analyze a single image and return result"""
@@ -349,11 +596,16 @@ def analyze_folder(folder_path: str, prompt: Optional[str], max_tokens: int, out
                 if verbose:
                     click.echo(f"Processing: {os.path.relpath(img_path, folder_path)}")
                 
-                result = analyzer.analyze_image(img_path, prompt, max_tokens)
+                payload = preprocessor.encode_payload(img_path)
+                result = analyzer.analyze_image(img_path, prompt, max_tokens, base64_image=payload["base64"],
+                                                detail=payload["detail"])
                 result["relative_path"] = os.path.relpath(img_path, folder_path)
+                if payload["detail"]:
+                    result["detail"] = payload["detail"]
                 result["analysis_with_research"] = agent_client.analyze_image_with_research(
                     img_path,
-                    custom_prompt=result["analysis"]
+                    custom_prompt=result["analysis"],
+                    base64_image=payload["base64"]
                 )
                 return result
             except Exception as e:
@@ -364,90 +616,126 @@ def analyze_folder(folder_path: str, prompt: Optional[str], max_tokens: int, out
                     "relative_path": os.path.relpath(img_path, folder_path)
                 }
         
+        def record(result):
+            writer.write(result)
+            for duplicate in duplicates.get(result["image_path"], []):
+                writer.write(dict(
+                    result,
+                    image_path=duplicate,
+                    relative_path=os.path.relpath(duplicate, folder_path),
+                    duplicate_of=result["relative_path"]
+                ))
+
         # Process images
-        if parallel > 1:
+        if concurrency > 0:
+            # Asyncio engine: bounded in-flight requests, adaptive RPM/TPM limiter
+            if verbose:
+                click.echo(f"Processing images with {concurrency} concurrent requests...")
+
+            limiter = AdaptiveRateLimiter(requests_per_minute=rpm, tokens_per_minute=tpm)
+
+            async def analyze_single_image_async(img_path):
+                if verbose:
+                    click.echo(f"Processing: {os.path.relpath(img_path, folder_path)}")
+
+                try:
+                    payload = await asyncio.wrap_future(preprocessor.submit_payload(img_path))
+                except Exception as e:
+                    return {
+                        "success": False,
+                        "error": str(e),
+                        "image_path": img_path,
+                        "relative_path": os.path.relpath(img_path, folder_path)
+                    }
+
+                result = await analyzer.analyze_image_async(img_path, prompt, max_tokens, limiter=limiter,
+                                                            base64_image=payload["base64"],
+                                                            detail=payload["detail"])
+                result["relative_path"] = os.path.relpath(img_path, folder_path)
+                if payload["detail"]:
+                    result["detail"] = payload["detail"]
+                if not result["success"]:
+                    return result
+                # The Foundry agent client is synchronous, run it in a worker thread
+                result["analysis_with_research"] = await asyncio.to_thread(
+                    agent_client.analyze_image_with_research,
+                    img_path,
+                    custom_prompt=result["analysis"],
+                    base64_image=payload["base64"]
+                )
+                return result
+
+            async def run_async_engine():
+                semaphore = asyncio.Semaphore(concurrency)
+                tasks = set()
+
+                # Record from inside each task so finished results are not kept in memory
+                async def analyze_and_record(img_path):
+                    try:
+                        record(await analyze_single_image_async(img_path))
+                    finally:
+                        semaphore.release()
+
+                try:
+                    with click.progressbar(image_files, label="Analyzing images") as bar:
+                        images = iter(bar)
+                        while True:
+                            await semaphore.acquire()
+                            # Pull from the scanner off the event loop, it may block on directory listings
+                            img_path = await asyncio.to_thread(next, images, None)
+                            if img_path is None:
+                                semaphore.release()
+                                break
+                            task = asyncio.create_task(analyze_and_record(img_path))
+                            tasks.add(task)
+                            task.add_done_callback(tasks.discard)
+                        await asyncio.gather(*tasks)
+                finally:
+                    await analyzer.async_client.close()
+
+            asyncio.run(run_async_engine())
+            results["rate_limit"] = {
+                "throttled_requests": limiter.throttled,
+                "seconds_waited": round(limiter.waited_seconds, 2)
+            }
+        elif parallel > 1:
             # Parallel processing
             if verbose:
                 click.echo(f"Processing images with {parallel} threads...")
             
             with ThreadPoolExecutor(max_workers=parallel) as executor:
-                # Submit all jobs
-                future_to_image = {executor.submit(analyze_single_image, img): img for img in image_files}
+                # Submit jobs as images are found, keeping a bounded number in flight
+                pending = set()
+                with click.progressbar(image_files, label="Analyzing images") as bar:
+                    for img_path in bar:
+                        pending.add(executor.submit(analyze_single_image, img_path))
+                        if len(pending) >= parallel * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                record(future.result())
                 
-                # Collect results as they complete
-                with click.progressbar(as_completed(future_to_image), length=len(image_files),
-                                     label="Analyzing images") as bar:
-                    for future in bar:
-                        result = future.result()
-                        results["images"].append(result)
-                        if result["success"]:
-                            results["successful_analyses"] += 1
-                        else:
-                            results["failed_analyses"] += 1
+                # Collect the remaining results as they complete
+                for future in as_completed(pending):
+                    record(future.result())
         else:
             # Sequential processing
             with click.progressbar(image_files, label="Analyzing images") as bar:
                 for img_path in bar:
-                    result = analyze_single_image(img_path)
-                    results["images"].append(result)
-                    if result["success"]:
-                        results["successful_analyses"] += 1
-                    else:
-                        results["failed_analyses"] += 1
-        
-        # Sort results by relative path for consistent output
-        results["images"].sort(key=lambda x: x.get("relative_path", ""))
-        
-        # Calculate summary statistics
-        total_tokens = sum(r.get("usage", {}).get("total_tokens", 0) for r in results["images"] if r["success"])
-        results["total_tokens_used"] = total_tokens
-        
-        # Display summary
-        click.echo("\n" + "="*60)
-        click.echo("FOLDER ANALYSIS SUMMARY")
-        click.echo("="*60)
-        click.echo(f"Folder: {folder_path}")
-        click.echo(f"Total images found: {results['total_images']}")
-        click.echo(f"Successfully analyzed: {results['successful_analyses']}")
-        click.echo(f"Failed analyses: {results['failed_analyses']}")
-        click.echo(f"Total tokens used: {total_tokens}")
-        click.echo("="*60)
-        
-        # Display individual results if verbose or small number of images
-        if verbose or len(image_files) <= 5:
-            for result in results["images"]:
-                #
-                # click.echo(f"\n--- {result['relative_path']} ---")
-                click.echo(f"\n--------------")
-                if result["success"]:
-                    click.echo(result["analysis"])
-                    #if verbose:
-                    #    usage = result.get("usage", {})
-                    #    click.echo(f"[Tokens: {usage.get('total_tokens', 'N/A')}]")
-                else:
-                    click.echo(f"ERROR: {result['error']}")
-        elif results["successful_analyses"] > 0:
-            click.echo(f"\nUse --verbose flag to see individual analysis results, or check the output file.")
-        
-        # Show failed images if any
-        if results["failed_analyses"] > 0:
-            click.echo(f"\nFailed to analyze {results['failed_analyses']} images:")
-            for result in results["images"]:
-                if not result["success"]:
-                    click.echo(f"  ✗ {result['relative_path']}: {result['error']}")
+                    record(analyze_single_image(img_path))
+
+        preprocessor.close()
+        writer.close()
+        agent_client.cleanup()
+
+        results["total_images"] = scan["found"]
+        if resume:
+            click.echo(f"Resumed from {checkpoint}: {scan['skipped']} images were already analyzed")
         
-        # Save to output file
-        if output:
-            with open(output, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
-            click.echo(f"\nDetailed results saved to: {output}")
-        else:
-            # Default output file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            default_output = f"image_analysis_{timestamp}.json"
-            with open(default_output, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
-            click.echo(f"\nDetailed results saved to: {default_output}")
+        if result_cache:
+            results["cache"] = result_cache.stats()
+            result_cache.close()
+
+        report_folder_results(results, output, checkpoint, verbose)
 
         # dump all the analysis to the output file
         #if verbose:
@@ -458,8 +746,207 @@ def analyze_folder(folder_path: str, prompt: Optional[str], max_tokens: int, out
         click.echo(f"Unexpected error: {e}", err=True)
         sys.exit(1)
 
+@cli.command()
+@click.argument('folder_path', type=click.Path(exists=True, file_okay=False, dir_okay=True))
+@click.option('--prompt', '-p', help='Custom prompt for image analysis')
+@click.option('--max-tokens', '-t', default=2000, help='Maximum tokens for response per image')
+@click.option('--output', '-o', type=click.Path(), help='Output file for results (JSON)')
+@click.option('--verbose', '-v', is_flag=True, help='Verbose output')
+@click.option('--extensions', '-e', default='jpg,jpeg,png,gif,bmp,tiff,webp', 
+              help='Comma-separated list of image extensions to process (default: jpg,jpeg,png,gif,bmp,tiff,webp)')
+@click.option('--deployment', '-d', help='Global Batch deployment to use (default: AZURE_OPENAI_BATCH_DEPLOYMENT_NAME, '
+                                         'then AZURE_OPENAI_DEPLOYMENT_NAME)')
+@click.option('--work-dir', default='batch_jobs', type=click.Path(file_okay=False),
+              help='Directory for the batch input files (default: batch_jobs)')
+@click.option('--poll-interval', default=30.0, type=float, help='Seconds between batch status checks (default: 30)')
+@click.option('--max-file-mb', default=190, type=int, help='Maximum size of one batch input file (default: 190)')
+@click.option('--preprocess-workers', type=int, help='Processes used to decode and resize images (default: CPU count)')
+def analyze_batch_offline(folder_path: str, prompt: Optional[str], max_tokens: int, output: Optional[str],
+                          verbose: bool, extensions: str, deployment: Optional[str], work_dir: str,
+                          poll_interval: float, max_file_mb: int, preprocess_workers: Optional[int]):
+    """
+    Analyze all images in a folder through the Azure OpenAI Batch API.
+    
+    Trades interactive latency for the Batch API's lower price and separate quota.
+    Results use the same schema as analyze-folder. Point AZURE_OPENAI_ENDPOINT at
+    mock_openai_server.py to run without network access.
+    
+    FOLDER_PATH: Path to the folder containing images to analyze
+    """
+    from datetime import datetime
+
+    try:
+        image_files = find_image_files(folder_path, extensions)
+        if not image_files:
+            click.echo(f"No image files found in {folder_path} with extensions: {extensions}")
+            return
+
+        analyzer = ImageAnalyzer()
+        analyzer.deployment_name = deployment or os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT_NAME",
+                                                           analyzer.deployment_name)
+
+        if not output:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output = f"image_analysis_{timestamp}.json"
+        checkpoint = os.path.splitext(output)[0] + ".jsonl"
+
+        results = {
+            "folder_path": folder_path,
+            "analyzed_at": datetime.now().isoformat(),
+            "total_images": len(image_files),
+            "successful_analyses": 0,
+            "failed_analyses": 0,
+            "prompt_used": prompt or "Default analysis prompt",
+            "results_jsonl": checkpoint,
+            "batch_jobs": []
+        }
+
+        with JsonlResultWriter(checkpoint) as writer:
+            # Build the input files from the preprocessed images, failures are recorded right away
+            def batch_requests(preprocessor):
+                for img_path, base64_image, error in preprocessor.encode_all(image_files):
+                    relative_path = os.path.relpath(img_path, folder_path)
+                    if error:
+                        writer.write({
+                            "success": False,
+                            "error": error,
+                            "image_path": img_path,
+                            "relative_path": relative_path
+                        })
+                        continue
+                    yield analyzer.build_batch_request(relative_path, base64_image, prompt, max_tokens)
+
+            click.echo(f"Preparing batch input for {len(image_files)} images...")
+            with ImagePreprocessor(preprocess_workers) as preprocessor:
+                input_files = write_batch_files(batch_requests(preprocessor), work_dir,
+                                                max_file_bytes=max_file_mb * 1024 * 1024)
+
+            # Submit every input file first so the jobs run side by side
+            jobs = []
+            for input_path in input_files:
+                batch = submit_batch(analyzer.batch_client, input_path, poll_interval)
+                click.echo(f"Submitted batch {batch.id} ({os.path.basename(input_path)})")
+                jobs.append((input_path, batch))
+                results["batch_jobs"].append(batch.id)
+
+            def show_status(batch):
+                if verbose:
+                    counts = batch.request_counts
+                    progress = f" {counts.completed + counts.failed}/{counts.total}" if counts else ""
+                    click.echo(f"Batch {batch.id}: {batch.status}{progress}")
+
+            for input_path, batch in jobs:
+                batch = wait_for_batch(analyzer.batch_client, batch.id, poll_interval, on_status=show_status)
+                click.echo(f"Batch {batch.id} finished with status: {batch.status}")
+
+                # Merge the output back, anything the job did not answer is a failure
+                pending = set()
+                with open(input_path, encoding="utf-8") as f:
+                    for line in f:
+                        pending.add(json.loads(line)["custom_id"])
+
+                for line in iter_batch_output(analyzer.batch_client, batch):
+                    relative_path = line["custom_id"]
+                    result = analyzer.result_from_batch_output(line, os.path.join(folder_path, relative_path))
+                    result["relative_path"] = relative_path
+                    writer.write(result)
+                    pending.discard(relative_path)
+
+                for relative_path in sorted(pending):
+                    writer.write({
+                        "success": False,
+                        "error": f"No result returned by batch {batch.id} (status: {batch.status})",
+                        "image_path": os.path.join(folder_path, relative_path),
+                        "relative_path": relative_path
+                    })
+
+        report_folder_results(results, output, checkpoint, verbose)
+
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}", err=True)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('folder_path', type=click.Path(exists=True, file_okay=False, dir_okay=True))
+@click.option('--extensions', '-e', default='jpg,jpeg,png,gif,bmp,tiff,webp', 
+              help='Comma-separated list of image extensions to process (default: jpg,jpeg,png,gif,bmp,tiff,webp)')
+@click.option('--output', '-o', type=click.Path(), help='Output file for the benchmark report (JSON)')
+@click.option('--verbose', '-v', is_flag=True, help='Show the estimate for every image')
+@click.option('--preprocess-workers', type=int, help='Processes used to decode and resize images (default: CPU count)')
+def benchmark_detail(folder_path: str, extensions: str, output: Optional[str], verbose: bool,
+                     preprocess_workers: Optional[int]):
+    """
+    Compare vision tokens of the fixed and adaptive detail policies, without calling the API.
+    
+    FOLDER_PATH: Path to the folder containing images to benchmark
+    """
+    try:
+        image_files = find_image_files(folder_path, extensions)
+        if not image_files:
+            click.echo(f"No image files found in {folder_path} with extensions: {extensions}")
+            return
+
+        with ImagePreprocessor(preprocess_workers) as preprocessor:
+            with click.progressbar(preprocessor.map(benchmark_detail_policy, image_files),
+                                   length=len(image_files), label="Benchmarking images") as bar:
+                rows = list(bar)
+
+        measured = [row for row in rows if "error" not in row]
+        fixed_tokens = sum(row["fixed_tokens"] for row in measured)
+        adaptive_tokens = sum(row["adaptive_tokens"] for row in measured)
+        report = {
+            "folder_path": folder_path,
+            "images": len(measured),
+            "failed": len(rows) - len(measured),
+            "fixed_tokens": fixed_tokens,
+            "adaptive_tokens": adaptive_tokens,
+            "tokens_saved": fixed_tokens - adaptive_tokens,
+            "tokens_saved_per_image": round((fixed_tokens - adaptive_tokens) / len(measured), 1) if measured else 0,
+            "low_detail_images": sum(1 for row in measured if row["adaptive_detail"] == "low"),
+            "fixed_bytes": sum(row["fixed_bytes"] for row in measured),
+            "adaptive_bytes": sum(row["adaptive_bytes"] for row in measured),
+            "results": rows
+        }
+
+        if verbose:
+            click.echo("")
+            for row in rows:
+                relative_path = os.path.relpath(row["image_path"], folder_path)
+                if "error" in row:
+                    click.echo(f"  ✗ {relative_path}: {row['error']}")
+                else:
+                    click.echo(f"  {relative_path}: {row['adaptive_detail']:<4} "
+                               f"{row['fixed_tokens']} -> {row['adaptive_tokens']} tokens "
+                               f"(saved {row['tokens_saved']})")
+
+        saved_pct = 100 * report["tokens_saved"] / fixed_tokens if fixed_tokens else 0
+        click.echo("\n" + "="*60)
+        click.echo("DETAIL POLICY BENCHMARK (estimated image prompt tokens)")
+        click.echo("="*60)
+        click.echo(f"Images measured: {report['images']} (failed: {report['failed']})")
+        click.echo(f"Fixed policy tokens: {fixed_tokens}")
+        click.echo(f"Adaptive policy tokens: {adaptive_tokens}")
+        click.echo(f"Tokens saved: {report['tokens_saved']} ({saved_pct:.1f}%), "
+                   f"{report['tokens_saved_per_image']} per image")
+        click.echo(f"Images sent at low detail: {report['low_detail_images']}")
+        click.echo(f"Payload bytes: {report['fixed_bytes']} -> {report['adaptive_bytes']}")
+        click.echo("="*60)
+
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            click.echo(f"\nBenchmark report saved to: {output}")
+
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}", err=True)
+        sys.exit(1)
+
+
 cli.add_command(analyze)
 cli.add_command(analyze_folder)
+cli.add_command(analyze_batch_offline)
+cli.add_command(benchmark_detail)
 
 if __name__ == '__main__':
     cli()
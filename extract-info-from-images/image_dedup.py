@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash deduplication of near-identical images.
+
+A 64-bit difference hash (dHash) is computed for every image, then each image
+joins the cluster of the first representative whose hash is within a
+Hamming-distance threshold, compared with vectorized NumPy operations. Only one
+representative per cluster needs to be sent to the model; its result is reused
+for the other members.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+# Number of set bits for every byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def dhash(image_path: str, hash_size: int = HASH_SIZE) -> Optional[int]:
+    """64-bit difference hash of an image, or None if it cannot be decoded"""
+    try:
+        with Image.open(image_path) as img:
+            # Only a tiny grayscale thumbnail is needed, let JPEG decode at reduced scale
+            img.draft("L", (hash_size * 16, hash_size * 16))
+            small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+            pixels = np.asarray(small, dtype=np.int16)
+    except Exception:
+        return None
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distances(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """Hamming distances between every hash of rows and every hash of cols (uint8 matrix)"""
+    xor = rows[:, None] ^ cols[None, :]
+    return _POPCOUNT[xor.view(np.uint8)].reshape(xor.shape[0], xor.shape[1], 8).sum(axis=2, dtype=np.uint8)
+
+
+def cluster_duplicates(hashes: Sequence[Optional[int]], threshold: int = 5,
+                       block_elements: int = 4_000_000) -> List[int]:
+    """Return, for every image, the index of its cluster representative.
+
+    Images are taken in order: each joins the first representative within
+    `threshold` bits, or becomes a representative itself. Every member is thus
+    within `threshold` bits of its representative, near-duplicates do not chain
+    into one cluster. Images without a hash are their own cluster.
+    """
+    representatives = list(range(len(hashes)))
+    valid = [i for i, h in enumerate(hashes) if h is not None]
+    if len(valid) < 2:
+        return representatives
+
+    values = np.array([hashes[i] for i in valid], dtype=np.uint64)
+    leaders: List[int] = []
+    # Compare in row blocks so the distance matrices stay within block_elements
+    block = max(1, block_elements // len(values))
+    for start in range(0, len(values), block):
+        positions = np.arange(start, min(start + block, len(values)))
+
+        # Rows close to a representative of an earlier block join the first of them
+        if leaders:
+            within = hamming_distances(values[positions], values[leaders]) <= threshold
+            matched = within.any(axis=1)
+            for position, leader in zip(positions[matched], within[matched].argmax(axis=1)):
+                representatives[valid[position]] = valid[leaders[leader]]
+            positions = positions[~matched]
+        if not len(positions):
+            continue
+
+        # The remaining rows are matched in order against the representatives they elect
+        within = hamming_distances(values[positions], values[positions]) <= threshold
+        elected = np.zeros(len(positions), dtype=bool)
+        for k, position in enumerate(positions):
+            earlier = np.flatnonzero(within[k, :k] & elected[:k])
+            if len(earlier):
+                representatives[valid[position]] = valid[positions[earlier[0]]]
+            else:
+                elected[k] = True
+                leaders.append(int(position))
+
+    representative_values = np.array([hashes[representatives[i]] for i in valid], dtype=np.uint64)
+    spread = _POPCOUNT[(values ^ representative_values).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+    assert spread.max() <= threshold, "cluster member farther than threshold from its representative"
+    return representatives
+
+
+def group_duplicates(image_paths: Sequence[str], hashes: Sequence[Optional[int]],
+                     threshold: int = 5) -> Dict[str, List[str]]:
+    """Map each representative image path to the paths of its near-duplicates"""
+    groups: Dict[str, List[str]] = {}
+    for i, representative in enumerate(cluster_duplicates(hashes, threshold)):
+        members = groups.setdefault(image_paths[representative], [])
+        if i != representative:
+            members.append(image_paths[i])
+    return groups
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Shared image preprocessing for ImageAnalyzer and FoundryImageAgent.
+
+Each image is decoded once, downscaled (using JPEG draft mode so large photos
+are scaled while decoding), re-encoded as JPEG and base64 encoded. Batches run
+the work in a process pool so the CPU-bound resizes are not limited by the GIL,
+and the same payload is handed to every consumer.
+
+The adaptive detail policy picks the target resolution, JPEG quality and the
+`detail` field per image from cheap local features (size, edge density, text
+likelihood), to cut vision prompt tokens where low detail is enough.
+"""
+
+import base64
+import io
+import math
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# OpenAI vision inputs larger than this are downscaled by the service anyway
+MAX_IMAGE_SIZE = (2048, 2048)
+JPEG_QUALITY = 85
+
+# Vision token accounting: "low" is a flat cost, "high" scales the shortest side
+# to 768px and charges per 512px tile
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_SIZE = 512
+
+# Adaptive policy thresholds, tuned on photos, screenshots and signage
+LOW_EDGE_DENSITY = 0.04
+TEXT_LIKELIHOOD = 0.25
+
+
+def _to_jpeg(img: Image.Image, max_size: Tuple[int, int], quality: int) -> bytes:
+    """Downscale an opened image to fit max_size and encode it as JPEG"""
+    # Resize if image is too large (OpenAI has size limits)
+    if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+    # Convert to RGB if necessary
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    # Save to bytes
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='JPEG', quality=quality)
+    return img_byte_arr.getvalue()
+
+
+def encode_image(image_path: str, max_size: Tuple[int, int] = MAX_IMAGE_SIZE, quality: int = JPEG_QUALITY) -> str:
+    """Decode, downscale and re-encode an image as a base64 JPEG string"""
+    try:
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+
+        try:
+            with Image.open(image_path) as img:
+                # For JPEG, let the decoder skip DCT scales we would throw away (no-op for other formats)
+                img.draft("RGB", max_size)
+                return base64.b64encode(_to_jpeg(img, max_size, quality)).decode('utf-8')
+
+        except Exception as e:
+            raise ValueError(f"Invalid image file: {e}")
+
+    except Exception as e:
+        raise Exception(f"Error processing image: {e}")
+
+
+def estimate_image_tokens(width: int, height: int, detail: Optional[str] = "high") -> int:
+    """Prompt tokens charged for one image ("auto" and None are counted as high detail)"""
+    if detail == "low":
+        return LOW_DETAIL_TOKENS
+    scale = min(1.0, MAX_IMAGE_SIZE[0] / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    return LOW_DETAIL_TOKENS + TILE_TOKENS * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def image_features(img: Image.Image) -> dict:
+    """Cheap local features used by the detail policy, computed on a 256px grayscale copy"""
+    gray = img.convert("L")
+    gray.thumbnail((256, 256))
+    pixels = np.asarray(gray, dtype=np.int16)
+    if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+        return {"edge_density": 0.0, "text_likelihood": 0.0}
+
+    dx = np.abs(np.diff(pixels, axis=1))[:-1, :]
+    dy = np.abs(np.diff(pixels, axis=0))[:, :-1]
+    edge_density = float(((dx > 32) | (dy > 32)).mean())
+
+    # Text shows up as rows crossed by many sharp transitions on a high-contrast background
+    transitions_per_row = (dx > 64).mean(axis=1)
+    text_rows = float((transitions_per_row > 0.08).mean())
+    contrast = float(((pixels < 60) | (pixels > 195)).mean())
+    return {"edge_density": round(edge_density, 4), "text_likelihood": round(text_rows * contrast * 2, 4)}
+
+
+def choose_detail_policy(width: int, height: int, features: dict) -> dict:
+    """Pick target size, JPEG quality and detail for one image"""
+    if max(width, height) <= LOW_DETAIL_SIZE:
+        # Low detail already sees the whole image at this size
+        return {"detail": "low", "max_size": (LOW_DETAIL_SIZE, LOW_DETAIL_SIZE), "quality": JPEG_QUALITY}
+
+    # High detail: the service scales the shortest side to 768px, sending more is wasted bytes
+    scale = min(1.0, HIGH_DETAIL_SHORT_SIDE / min(width, height), MAX_IMAGE_SIZE[0] / max(width, height))
+    high_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    if features["text_likelihood"] >= TEXT_LIKELIHOOD:
+        # Dense text needs the tiles and a sharper encoding
+        return {"detail": "high", "max_size": high_size, "quality": 90}
+    if features["edge_density"] < LOW_EDGE_DENSITY:
+        # Large flat areas: simple screenshots, signs, plain backgrounds
+        return {"detail": "low", "max_size": (LOW_DETAIL_SIZE, LOW_DETAIL_SIZE), "quality": 80}
+    return {"detail": "high", "max_size": high_size, "quality": JPEG_QUALITY}
+
+
+def encode_payload(image_path: str, detail_policy: str = "fixed") -> dict:
+    """Encode an image for the chat API as {"base64", "detail", ...}.
+
+    "fixed" reproduces encode_image with no detail field, "adaptive" applies
+    choose_detail_policy and records the features and estimated tokens.
+    """
+    if detail_policy == "fixed":
+        return {"base64": encode_image(image_path), "detail": None}
+
+    try:
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+
+        try:
+            with Image.open(image_path) as img:
+                width, height = img.size
+                img.draft("RGB", MAX_IMAGE_SIZE)
+                features = image_features(img)
+                policy = choose_detail_policy(width, height, features)
+                data = _to_jpeg(img, policy["max_size"], policy["quality"])
+                return {
+                    "base64": base64.b64encode(data).decode('utf-8'),
+                    "detail": policy["detail"],
+                    "quality": policy["quality"],
+                    "size": list(img.size),
+                    "features": features,
+                    "estimated_tokens": estimate_image_tokens(img.size[0], img.size[1], policy["detail"])
+                }
+
+        except Exception as e:
+            raise ValueError(f"Invalid image file: {e}")
+
+    except Exception as e:
+        raise Exception(f"Error processing image: {e}")
+
+
+def benchmark_detail_policy(image_path: str) -> dict:
+    """Compare estimated tokens and payload bytes of the fixed and adaptive encodings"""
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+        fixed = base64.b64decode(encode_image(image_path))
+        with Image.open(io.BytesIO(fixed)) as fixed_img:
+            fixed_tokens = estimate_image_tokens(*fixed_img.size, "high")
+        adaptive = encode_payload(image_path, "adaptive")
+    except Exception as e:
+        return {"image_path": image_path, "error": str(e)}
+
+    return {
+        "image_path": image_path,
+        "original_size": [width, height],
+        "fixed_tokens": fixed_tokens,
+        "fixed_bytes": len(fixed),
+        "adaptive_detail": adaptive["detail"],
+        "adaptive_size": adaptive["size"],
+        "adaptive_tokens": adaptive["estimated_tokens"],
+        "adaptive_bytes": len(adaptive["base64"]) * 3 // 4,
+        "features": adaptive["features"],
+        "tokens_saved": fixed_tokens - adaptive["estimated_tokens"]
+    }
+
+
+class ImagePreprocessor:
+    """Process pool that encodes images once for every consumer"""
+
+    def __init__(self, workers: Optional[int] = None, detail_policy: str = "fixed"):
+        self.workers = workers or os.cpu_count() or 1
+        self.detail_policy = detail_policy
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, image_path: str) -> Future:
+        """Schedule encoding of `image_path`, returning a future of the base64 payload"""
+        return self._executor.submit(encode_image, image_path)
+
+    def encode(self, image_path: str) -> str:
+        """Encode `image_path` in the pool and wait for the result"""
+        return self.submit(image_path).result()
+
+    def submit_payload(self, image_path: str) -> Future:
+        """Schedule encode_payload with this pool's detail policy"""
+        return self._executor.submit(encode_payload, image_path, self.detail_policy)
+
+    def encode_payload(self, image_path: str) -> dict:
+        """Encode `image_path` with the detail policy and wait for the result"""
+        return self.submit_payload(image_path).result()
+
+    def map(self, fn, image_paths: Iterable[str], chunksize: int = 16) -> Iterator:
+        """Apply a picklable per-image function (e.g. image_dedup.dhash) in the pool, in input order"""
+        return self._executor.map(fn, image_paths, chunksize=chunksize)
+
+    def encode_all(self, image_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """Yield (path, base64 payload, error) in input order, with a bounded number of images in flight"""
+        window = deque()
+        for image_path in image_paths:
+            window.append((image_path, self.submit(image_path)))
+            if len(window) >= self.workers * 4:
+                yield self._collect(*window.popleft())
+        while window:
+            yield self._collect(*window.popleft())
+
+    @staticmethod
+    def _collect(image_path: str, future: Future) -> Tuple[str, Optional[str], Optional[str]]:
+        try:
+            return image_path, future.result(), None
+        except Exception as e:
+            return image_path, None, str(e)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
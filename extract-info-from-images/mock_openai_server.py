@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Azure OpenAI Files, Batches and chat completions APIs.
+
+Lets analyze-batch-offline (and analyze/analyze-folder's GPT-4 Vision step) run
+with no network access. Responses are deterministic: each request is answered
+with a short mock analysis and token counts derived from the request size.
+
+Usage:
+    python mock_openai_server.py --port 8765
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8765 AZURE_OPENAI_API_KEY=mock \\
+        python image_analyzer.py analyze-batch-offline ./inputs --poll-interval 1
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import click
+
+
+class MockState:
+    """Files and batches held in memory by the server"""
+
+    def __init__(self, batch_delay: float):
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        file_id = f"file-{uuid.uuid4().hex}"
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        with self.lock:
+            self.files[file_id] = (meta, content)
+        return meta
+
+
+def mock_completion(body: dict) -> dict:
+    """Deterministic chat completion for a request body"""
+    text = " ".join(
+        part.get("text", "")
+        for message in body.get("messages", [])
+        for part in (message["content"] if isinstance(message["content"], list) else [{"text": message["content"]}])
+        if isinstance(part, dict)
+    )
+    prompt_tokens = max(1, len(json.dumps(body)) // 1000 + len(text) // 4)
+    content = f"Mock analysis ({body.get('model')}): {text[:80]}"
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def run_batch(state: MockState, batch_id: str):
+    """Answer every request of a batch input file, then publish the output file"""
+    with state.lock:
+        batch = state.batches[batch_id]
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        _, content = state.files[batch["input_file_id"]]
+
+    time.sleep(state.batch_delay)
+    lines = []
+    for raw in content.decode("utf-8").splitlines():
+        if not raw.strip():
+            continue
+        request = json.loads(raw)
+        lines.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": mock_completion(request["body"])},
+            "error": None
+        }))
+
+    output = state.add_file("batch_output.jsonl", "batch_output", ("\n".join(lines) + "\n").encode("utf-8"))
+    with state.lock:
+        batch.update({
+            "status": "completed",
+            "output_file_id": output["id"],
+            "completed_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0}
+        })
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload, content_type: str = "application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_found(self):
+            self._send(404, {"error": {"code": "NotFound", "message": f"No mock route for {self.path}"}})
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            match = re.fullmatch(r"/openai/files/([^/]+)(/content)?", path)
+            if match:
+                with state.lock:
+                    entry = state.files.get(match.group(1))
+                if not entry:
+                    return self._not_found()
+                if match.group(2):
+                    return self._send(200, entry[1], "application/octet-stream")
+                return self._send(200, entry[0])
+
+            match = re.fullmatch(r"/openai/batches/([^/]+)", path)
+            if match:
+                with state.lock:
+                    batch = state.batches.get(match.group(1))
+                    batch = dict(batch) if batch else None
+                return self._send(200, batch) if batch else self._not_found()
+
+            self._not_found()
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            if path == "/openai/files":
+                # Multipart upload: parse it with the email package
+                message = BytesParser(policy=default_policy).parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + self._body()
+                )
+                fields, content, filename = {}, b"", "upload.jsonl"
+                for part in message.iter_parts():
+                    name = part.get_param("name", header="content-disposition")
+                    if name == "file":
+                        content = part.get_payload(decode=True) or b""
+                        filename = part.get_filename() or filename
+                    else:
+                        fields[name] = part.get_content().strip()
+                return self._send(200, state.add_file(filename, fields.get("purpose", "batch"), content))
+
+            if path == "/openai/batches":
+                request = json.loads(self._body())
+                batch = {
+                    "id": f"batch_{uuid.uuid4().hex}",
+                    "object": "batch",
+                    "endpoint": request["endpoint"],
+                    "input_file_id": request["input_file_id"],
+                    "completion_window": request.get("completion_window", "24h"),
+                    "status": "validating",
+                    "created_at": int(time.time()),
+                    "output_file_id": None,
+                    "error_file_id": None
+                }
+                with state.lock:
+                    state.batches[batch["id"]] = batch
+                threading.Thread(target=run_batch, args=(state, batch["id"]), daemon=True).start()
+                return self._send(200, batch)
+
+            if re.fullmatch(r"/openai/deployments/[^/]+/chat/completions", path):
+                return self._send(200, mock_completion(json.loads(self._body())))
+
+            self._not_found()
+
+        def log_message(self, format, *args):
+            click.echo(f"[mock] {self.address_string()} {format % args}")
+
+    return Handler
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+@click.option('--port', default=8765, type=int, help='Port to listen on (default: 8765)')
+@click.option('--batch-delay', default=1.0, type=float, help='Seconds a batch stays in progress (default: 1)')
+def main(host: str, port: int, batch_delay: float):
+    """Serve the mock Azure OpenAI API until interrupted"""
+    server = ThreadingHTTPServer((host, port), make_handler(MockState(batch_delay)))
+    click.echo(f"Mock Azure OpenAI server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Adaptive token-bucket rate limiter for Azure OpenAI calls.
+
+Limits requests per minute and tokens per minute on the client side and
+adapts to the service: a 429 with a retry-after header pauses every caller
+until the window reopens and lowers the refill rate, while successful
+responses slowly bring it back up.
+"""
+
+import asyncio
+import time
+from typing import Mapping, Optional
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]], default: float = 1.0) -> float:
+    """Return the delay in seconds requested by a 429 response"""
+    if not headers:
+        return default
+
+    # Azure OpenAI sends the millisecond variant, fall back to the standard header
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000.0, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+
+    return default
+
+
+class _Bucket:
+    """A single token bucket refilled continuously at `rate` units per second"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.max_rate = self.rate
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)"""
+        # A request larger than the bucket may proceed once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class AdaptiveRateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter that learns from 429 responses"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 decrease_factor: float = 0.5, increase_factor: float = 1.05):
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self.decrease_factor = decrease_factor
+        self.increase_factor = increase_factor
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        # Counters reported in the run summary
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _buckets(self):
+        return [(bucket, name) for bucket, name in ((self._requests, "requests"), (self._tokens, "tokens")) if bucket]
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request consuming `tokens` tokens may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                delay = max(self._paused_until - now, 0.0)
+                for bucket, name in self._buckets():
+                    bucket.refill(now)
+                    delay = max(delay, bucket.wait_time(1 if name == "requests" else tokens))
+
+                if delay <= 0:
+                    if self._requests:
+                        self._requests.level -= 1
+                    if self._tokens:
+                        self._tokens.level -= min(tokens, self._tokens.capacity)
+                    return
+
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+
+    def refund(self, tokens: int):
+        """Give back tokens reserved by `acquire` but not actually used"""
+        if self._tokens and tokens > 0:
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + tokens)
+
+    def record_success(self, headers: Optional[Mapping[str, str]] = None):
+        """Slowly restore the refill rate and resync with the service's remaining quota"""
+        for bucket, _ in self._buckets():
+            bucket.rate = min(bucket.max_rate, bucket.rate * self.increase_factor)
+
+        if not headers:
+            return
+
+        # Never believe we have more budget than the service reports
+        for bucket, name in self._buckets():
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            if remaining is None:
+                continue
+            try:
+                bucket.level = min(bucket.level, float(remaining))
+            except ValueError:
+                pass
+
+    def record_throttle(self, retry_after: float):
+        """Pause all callers for `retry_after` seconds and lower the refill rate"""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        for bucket, _ in self._buckets():
+            bucket.rate = max(bucket.max_rate * 0.05, bucket.rate * self.decrease_factor)
+            bucket.level = 0.0
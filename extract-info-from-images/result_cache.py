@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for image analysis results.
+
+Results are keyed by a hash of the image bytes, the prompt, the deployment name
+and max_tokens, so re-running a folder only pays for images that changed.
+Storage is a single SQLite file; the least recently used entries are evicted
+once the total payload size goes over the configured limit.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResultCache:
+    """SQLite-backed LRU cache of analysis results"""
+
+    def __init__(self, path: str = ".image_analysis_cache.sqlite", max_size_mb: int = 256):
+        self.path = path
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # One connection shared by worker threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    @staticmethod
+    def make_key(image_path: str, prompt: Optional[str], deployment_name: str, max_tokens: int,
+                 detail: Optional[str] = None) -> str:
+        """Hash the image content together with every parameter that changes the answer"""
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        parts = [prompt or "", deployment_name, str(max_tokens)]
+        # Only appended when set, so keys of the fixed encoding stay valid
+        if detail:
+            parts.append(detail)
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached result for `key`, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        """Store a successful result and evict the least recently used entries if over size"""
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._size += size - (previous[0] if previous else 0)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_size_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM results ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= self.max_size_bytes:
+                    break
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._size -= size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Counters for the run summary"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
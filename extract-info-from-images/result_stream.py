@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Streaming JSONL storage for analyze_folder results.
+
+Each result is appended to a JSONL checkpoint file as soon as it is available
+and fsync'ed periodically, so a crash only loses the last few images and a
+later run can resume where it stopped. Summaries and the final JSON report are
+built by streaming over the file instead of keeping every result in memory.
+"""
+
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Set, Tuple
+
+
+class JsonlResultWriter:
+    """Append-only JSONL writer with periodic fsync"""
+
+    def __init__(self, path: str, append: bool = False, fsync_every: int = 50, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        if append:
+            _truncate_partial_line(path)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, result: dict):
+        """Append one result (not thread safe: call from the thread collecting results)"""
+        self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _truncate_partial_line(path: str):
+    """Drop a line left half-written by a crash so appended records stay parseable"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk back to the last complete line
+        position = end
+        while position > 0:
+            step = min(65536, position)
+            position -= step
+            f.seek(position)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                f.truncate(position + newline + 1)
+                return
+        f.truncate(0)
+
+
+def iter_results(path: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (byte offset, result) for every complete record in a JSONL file"""
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                pass  # torn line from an interrupted run
+            offset += len(line)
+
+
+def load_completed(path: str) -> Set[str]:
+    """Relative paths already analyzed successfully, for --resume"""
+    if not os.path.exists(path):
+        return set()
+    latest: Dict[str, bool] = {}
+    for _, result in iter_results(path):
+        latest[result.get("relative_path", "")] = result.get("success", False)
+    return {relative_path for relative_path, success in latest.items() if success}
+
+
+def summarize(path: str) -> dict:
+    """Stream over the checkpoint and compute the run summary.
+
+    When an image appears several times (failed, then retried on resume) only the
+    last record counts. Only a sorted (relative_path, offset) index is kept in
+    memory; records are read back from disk on demand with `read_results`.
+    """
+    latest: Dict[str, int] = {}
+    for offset, result in iter_results(path):
+        latest[result.get("relative_path", "")] = offset
+
+    index: List[Tuple[str, int]] = sorted(latest.items())
+    summary = {
+        "successful_analyses": 0,
+        "failed_analyses": 0,
+        "cached_analyses": 0,
+        "deduplicated_analyses": 0,
+        "total_tokens_used": 0,
+        "index": index,
+    }
+    for result in read_results(path, index):
+        if result.get("success"):
+            summary["successful_analyses"] += 1
+            if result.get("duplicate_of"):
+                summary["deduplicated_analyses"] += 1
+            elif result.get("cached"):
+                summary["cached_analyses"] += 1
+            else:
+                summary["total_tokens_used"] += result.get("usage", {}).get("total_tokens", 0)
+        else:
+            summary["failed_analyses"] += 1
+    return summary
+
+
+def read_results(path: str, index: List[Tuple[str, int]]) -> Iterator[dict]:
+    """Yield the records referenced by a `summarize` index, in index order"""
+    with open(path, "rb") as f:
+        for _, offset in index:
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+
+def write_json_report(output: str, header: dict, path: str, index: List[Tuple[str, int]]):
+    """Write `header` plus an "images" array streamed from the checkpoint file"""
+    with open(output, "w", encoding="utf-8") as f:
+        body = json.dumps(header, indent=2, ensure_ascii=False)
+        f.write(body[:-2] + ',\n  "images": [')
+        for position, result in enumerate(read_results(path, index)):
+            f.write("," if position else "")
+            f.write("\n    " + json.dumps(result, ensure_ascii=False))
+        f.write("\n  ]\n}\n")
@@ -1,4 +1,6 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from azure.ai.projects import AIProjectClient
 from azure.ai.projects.models import ConnectionType
 from azure.identity import DefaultAzureCredential
@@ -15,8 +17,9 @@ project = AIProjectClient.from_connection_string(
     conn_str=os.environ["AIPROJECT_CONNECTION_STRING"], credential=DefaultAzureCredential()
 )
 
-# create a vector embeddings client that will be used to generate vector embeddings
-embeddings = project.inference.get_embeddings_client()
+# create a vector embeddings client that will be used to generate vector embeddings, its pipeline
+# retries rate limits (429) and server errors, waiting as long as the service's retry-after asks
+embeddings = project.inference.get_embeddings_client(retry_total=6, retry_backoff_max=60)
 
 # use the project client to get the default search connection
 search_connection = project.connections.get_default(
@@ -128,31 +131,84 @@ def create_index_definition(index_name: str, model: str) -> SearchIndex:
         vector_search=vector_search,
     )
 
+# rough token count for batching, about 4 characters per token for English text
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+# group row indexes into batches limited both in number of inputs and in estimated tokens
+def make_batches(texts: list[str], batch_size: int, max_batch_tokens: int) -> list[list[int]]:
+    batches, batch, batch_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 # define a function for indexing a csv file, that adds each row as a document
-# and generates vector embeddings for the specified content_column
-def create_docs_from_csv(path: str, content_column: str, model: str) -> list[dict[str, any]]:
-    products = pd.read_csv(path)
+# and generates vector embeddings for the specified content_column, several rows per request
+# and several requests in flight at once
+def create_docs_from_csv(
+    path: str, content_column: str, model: str, batch_size: int = 64, max_batch_tokens: int = 32000, concurrency: int = 4
+) -> list[dict[str, any]]:
+    products = pd.read_csv(path).to_dict("records")
+    contents = [product[content_column] for product in products]
+    vectors = [None] * len(products)
+
+    batches = make_batches(contents, batch_size, max_batch_tokens)
+    logger.info(f"🧮 Embedding {len(products)} rows in {len(batches)} batches, {concurrency} in flight")
+
+    start = time.perf_counter()
+    rows_done, tokens_done, last_report = 0, 0, start
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(embeddings.embed, input=[contents[i] for i in batch], model=model): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            emb = future.result()
+            for item in emb.data:
+                vectors[batch[item.index]] = item.embedding
+
+            rows_done += len(batch)
+            usage = getattr(emb, "usage", None)
+            tokens_done += usage.prompt_tokens if usage else sum(estimate_tokens(contents[i]) for i in batch)
+            now = time.perf_counter()
+            if now - last_report >= 5 or rows_done == len(products):
+                elapsed = now - start
+                logger.info(
+                    f"📈 {rows_done}/{len(products)} rows embedded, "
+                    f"{rows_done / elapsed:.1f} rows/s, {tokens_done / elapsed:.0f} tokens/s"
+                )
+                last_report = now
+
+    missing = sum(vector is None for vector in vectors)
+    if missing:
+        raise RuntimeError(f"The embeddings service returned no vector for {missing} of {len(products)} rows")
+
     items = []
-    for product in products.to_dict("records"):
-        content = product[content_column]
+    for product, content, vector in zip(products, contents, vectors):
         id = str(product["id"])
         title = product["name"]
         url = f"/products/{title.lower().replace(' ', '-')}"
-        emb = embeddings.embed(input=content, model=model)
         rec = {
             "id": id,
             "content": content,
             "filepath": f"{title.lower().replace(' ', '-')}",
             "title": title,
             "url": url,
-            "contentVector": emb.data[0].embedding,
+            "contentVector": vector,
         }
         items.append(rec)
 
     return items
 
 
-def create_index_from_csv(index_name, csv_file):
+def create_index_from_csv(index_name, csv_file, batch_size=64, max_batch_tokens=32000, concurrency=4):
     # If a search index already exists, delete it:
     try:
         index_definition = index_client.get_index(index_name)
@@ -166,7 +222,14 @@ def create_index_from_csv(index_name, csv_file):
     index_client.create_index(index_definition)
 
     # create documents from the products.csv file, generating vector embeddings for the "description" column
-    docs = create_docs_from_csv(path=csv_file, content_column="description", model=os.environ["EMBEDDINGS_MODEL"])
+    docs = create_docs_from_csv(
+        path=csv_file,
+        content_column="description",
+        model=os.environ["EMBEDDINGS_MODEL"],
+        batch_size=batch_size,
+        max_batch_tokens=max_batch_tokens,
+        concurrency=concurrency,
+    )
 
     # Add the documents to the index using the Azure AI Search client
     search_client = SearchClient(
@@ -191,8 +254,13 @@ if __name__ == "__main__":
     parser.add_argument(
         "--csv-file", type=str, help="path to data for creating search index", default="assets/products.csv"
     )
+    parser.add_argument("--batch-size", type=int, help="maximum rows per embeddings request", default=64)
+    parser.add_argument(
+        "--max-batch-tokens", type=int, help="maximum estimated tokens per embeddings request", default=32000
+    )
+    parser.add_argument("--concurrency", type=int, help="embeddings requests in flight at once", default=4)
     args = parser.parse_args()
     index_name = args.index_name
     csv_file = args.csv_file
 
-    create_index_from_csv(index_name, csv_file)
\ No newline at end of file
+    create_index_from_csv(index_name, csv_file, args.batch_size, args.max_batch_tokens, args.concurrency)
\ No newline at end of file